@@ -0,0 +1,238 @@
+# bench_load.py
+# drives StrafesClient calls and MainCog commands against the mock api at a set concurrency and reports the latency
+# percentiles and how many upstream requests every call/command took
+# every scenario gets a new client and cog so caches filled by one scenario don't make the next one look faster,
+# use --warmup to measure with warm caches instead
+# run from the src directory: python -m benchmarks.bench_load [--concurrency 16] [--requests 200] [--latency 0.05] ...
+import argparse
+import asyncio
+import contextlib
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import discord
+from discord.ext import commands
+
+from benchmarks.mock_api import MockAPI, MockData
+from cogs.maincog import MainCog
+from modules.strafes import StrafesClient
+from modules.strafes_base import *
+
+class BenchAuthor:
+
+    def __init__(self, id : int):
+        self.id = id
+        self.name = f"bench_{id}"
+        self.discriminator = "0"
+
+class BenchMessage:
+
+    def __init__(self, content : str):
+        self.content = content
+        self.jump_url = ""
+
+# the parts of commands.Context that the cog's commands use, replies are kept instead of sent
+class BenchContext:
+
+    def __init__(self, cog : MainCog, command : commands.Command, author_id : int, content : str):
+        self.cog = cog
+        self.bot = cog.bot
+        self.command = command
+        self.author = BenchAuthor(author_id)
+        self.guild = None
+        self.message = BenchMessage(content)
+        self.command_failed = False
+        self.sent : List[Tuple[Any, Dict[str, Any]]] = []
+
+    async def send(self, content : str = None, **kwargs):
+        self.sent.append((content, kwargs))
+
+    def typing(self):
+        return contextlib.nullcontext()
+
+class Bench:
+
+    def __init__(self, api : MockAPI, client : StrafesClient, cog : MainCog):
+        self.api = api
+        self.data : MockData = api.data
+        self.client = client
+        self.cog = cog
+        self._commands = {command.name: command for command in cog.get_commands()}
+        # users that have times, the ones with the lowest ids have the most
+        self.users = sorted(self.data.by_user)[:500]
+
+    def user_id(self, rng : random.Random) -> int:
+        return rng.choice(self.users)
+
+    def user_name(self, rng : random.Random) -> str:
+        return self.data.users[self.user_id(rng)]["name"]
+
+    # a map the user has a time on in the style, or any map of the game
+    def map_name(self, rng : random.Random, user_id : Optional[int] = None, game : Game = Game.BHOP, style : Style = Style.AUTOHOP) -> str:
+        rows = [row for row in self.data.by_user.get(user_id, ()) if row["Game"] == game.value and row["Style"] == style.value]
+        if rows:
+            map_id = rng.choice(rows)["Map"]
+        else:
+            map_id = rng.choice([map["ID"] for map in self.data.maps if map["Game"] == game.value])
+        return self.client.get_catalog().map_from_id(map_id).displayname
+
+    # runs a command the way discord.py invokes it, minus the checks
+    async def command(self, name : str, *args : str, author_id : int = 1):
+        command = self._commands[name]
+        ctx = BenchContext(self.cog, command, author_id, f"!{name} {' '.join(args)}")
+        await self.cog.cog_before_invoke(ctx)
+        try:
+            await command.callback(self.cog, ctx, *args)
+        except Exception:
+            ctx.command_failed = True
+            raise
+        finally:
+            await self.cog.cog_after_invoke(ctx)
+
+ScenarioFunc = Callable[[Bench, random.Random, int], Awaitable[Any]]
+
+async def _user_times(bench : Bench, rng : random.Random, i : int):
+    user = await bench.client.get_user_data(bench.user_id(rng))
+    await bench.client.get_user_times(user, None, None, rng.randint(1, 3))
+
+async def _all_user_times(bench : Bench, rng : random.Random, i : int):
+    user = await bench.client.get_user_data(bench.user_id(rng))
+    await bench.client.get_user_times(user, Game.BHOP, Style.AUTOHOP, -1)
+
+async def _map_times(bench : Bench, rng : random.Random, i : int):
+    map = await bench.client.map_from_name(bench.map_name(rng), Game.BHOP)
+    await bench.client.get_map_times(Style.AUTOHOP, map, rng.randint(1, 2))
+
+async def _user_rank(bench : Bench, rng : random.Random, i : int):
+    user = await bench.client.get_user_data(bench.user_id(rng))
+    await bench.client.get_user_rank(user, Game.BHOP, Style.AUTOHOP)
+
+async def _pb(bench : Bench, rng : random.Random, i : int):
+    user_id = bench.user_id(rng)
+    await bench.command("pb", bench.data.users[user_id]["name"], "bhop", "auto", bench.map_name(rng, user_id), author_id=i)
+
+SCENARIOS : Dict[str, ScenarioFunc] = {
+    "client.get_ranks":lambda bench, rng, i: bench.client.get_ranks(Game.BHOP, Style.AUTOHOP, rng.randint(1, 20)),
+    "client.get_user_times":_user_times,
+    "client.get_user_times(all)":_all_user_times,
+    "client.get_map_times":_map_times,
+    "client.get_user_rank":_user_rank,
+    "client.get_user_data_from_list":lambda bench, rng, i: bench.client.get_user_data_from_list(rng.sample(list(bench.data.users), 50)),
+    "!ranks":lambda bench, rng, i: bench.command("ranks", "bhop", "auto", str(rng.randint(1, 20)), author_id=i),
+    "!times":lambda bench, rng, i: bench.command("times", bench.user_name(rng), author_id=i),
+    "!wrmap":lambda bench, rng, i: bench.command("wrmap", "bhop", "auto", bench.map_name(rng), author_id=i),
+    "!profile":lambda bench, rng, i: bench.command("profile", bench.user_name(rng), "bhop", "auto", author_id=i),
+    "!pb":_pb,
+    "!compare":lambda bench, rng, i: bench.command("compare", bench.user_name(rng), bench.user_name(rng), "bhop", "auto", author_id=i),
+    "!recentwrs":lambda bench, rng, i: bench.command("recentwrs", "bhop", "auto", author_id=i),
+    "!map":lambda bench, rng, i: bench.command("map", "bhop", bench.map_name(rng), author_id=i)
+}
+
+def percentile(values : List[float], p : float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+class Result:
+
+    def __init__(self, name : str, latencies : List[float], errors : int, seconds : float, calls : int, ratelimited : int):
+        self.name = name
+        self.latencies = sorted(latencies)
+        self.errors = errors
+        self.seconds = seconds
+        self.calls = calls
+        self.ratelimited = ratelimited
+
+    def row(self) -> str:
+        count = len(self.latencies)
+        p50, p95, p99 = (percentile(self.latencies, p) * 1000 for p in (0.5, 0.95, 0.99))
+        return f"{self.name:<30}{count:>6}{self.errors:>6}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}" \
+            f"{count / self.seconds:>9.1f}{self.calls / max(1, count):>11.2f}{self.ratelimited:>6}"
+
+HEADER = f"{'scenario':<30}{'n':>6}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}{'calls/req':>11}{'429s':>6}"
+
+async def make_bench(api : MockAPI, bot : commands.Bot) -> Bench:
+    client = StrafesClient("bench", **api.client_urls())
+    # load_maps would also overwrite the map snapshot, so build the catalog directly
+    await client._set_maps(*await client._fetch_maps())
+    cog = MainCog(bot)
+    cog.strafes = client
+    return Bench(api, client, cog)
+
+async def run_scenario(api : MockAPI, bot : commands.Bot, name : str, func : ScenarioFunc, requests : int, concurrency : int,
+        warmup : int, seed : int, show_errors : bool) -> Result:
+    bench = await make_bench(api, bot)
+    try:
+        rng = random.Random(seed)
+        for i in range(warmup):
+            try:
+                await func(bench, rng, i)
+            except Exception:
+                pass
+        api.reset_counts()
+        latencies : List[float] = []
+        errors = 0
+        next_request = 0
+
+        async def worker():
+            nonlocal next_request, errors
+            while next_request < requests:
+                i = next_request
+                next_request += 1
+                start = time.perf_counter()
+                try:
+                    await func(bench, rng, i)
+                except Exception as error:
+                    errors += 1
+                    if show_errors:
+                        print(f"{name}: {type(error).__name__}: {error}")
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+        return Result(name, latencies, errors, seconds, api.total_calls, api.ratelimited)
+    finally:
+        await bench.cog.broadcaster.close()
+        await bench.client.close()
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load benchmark of StrafesClient and MainCog against a mock api.")
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run (default: all): {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=16, help="calls/commands in flight at once")
+    parser.add_argument("--requests", type=int, default=200, help="calls/commands per scenario")
+    parser.add_argument("--warmup", type=int, default=0, help="untimed calls/commands before every scenario")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the mock api waits before every response")
+    parser.add_argument("--jitter", type=float, default=0.02, help="up to this many more seconds of latency, at random")
+    parser.add_argument("--ratelimit", type=int, default=100000, help="strafes.net requests allowed per minute (the real api allows 100)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="chance that any request gets a 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--show-errors", action="store_true", help="print every error")
+    parser.add_argument("--endpoints", action="store_true", help="print the upstream calls of every scenario by endpoint")
+    args = parser.parse_args()
+
+    names = args.scenarios or list(SCENARIOS)
+    for name in names:
+        if name not in SCENARIOS:
+            parser.error(f"Unknown scenario: {name}")
+
+    api = MockAPI(latency=args.latency, jitter=args.jitter, ratelimit=args.ratelimit, error_rate=args.error_rate, seed=args.seed)
+    await api.start()
+    bot = commands.Bot(command_prefix="!", intents=discord.Intents.none())
+    try:
+        print(f"{len(api.data.maps)} maps, {len(api.data.users)} users, {len(api.data.times)} times, "
+            f"latency {args.latency * 1000:.0f}+{args.jitter * 1000:.0f}ms, concurrency {args.concurrency}")
+        print(HEADER)
+        for name in names:
+            result = await run_scenario(api, bot, name, SCENARIOS[name], args.requests, args.concurrency, args.warmup, args.seed, args.show_errors)
+            print(result.row())
+            if args.endpoints:
+                for endpoint, count in api.calls.most_common():
+                    print(f"    {endpoint:<40}{count / max(1, args.requests):>8.2f}/req")
+    finally:
+        await bot.close()
+        await api.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+# bench_models.py
+# measures the construction time and memory use of the models in strafes_base
+# run from the src directory: python -m benchmarks.bench_models [count]
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from modules.strafes_base import *
+
+def make_record_dicts(count : int) -> List[Dict[str, Any]]:
+    random.seed(0)
+    return [{
+        "ID":i,
+        "Time":random.randint(1000, 600000),
+        "User":random.randint(1, 10000),
+        "Map":random.randint(1, 5000),
+        "Date":random.randint(1500000000, 1660000000),
+        "Style":random.randint(1, 7),
+        "Mode":0,
+        "Game":random.randint(1, 2)
+    } for i in range(count)]
+
+def build_records(dicts : List[Dict[str, Any]]) -> List[Record]:
+    user = User()
+    map = Map(1, "bhop_benchmark", "fiveman1", Game.BHOP, Date(1600000000), 1)
+    return [Record.from_dict(d, user, map) for d in dicts]
+
+def format_records(records : List[Record]):
+    for record in records:
+        str(record.time)
+        str(record.date)
+
+def timed(name : str, count : int, func : Callable[[], Any]) -> Any:
+    start = time.perf_counter()
+    result = func()
+    end = time.perf_counter()
+    print(f"{name:<28}{end - start:9.4f}s {1e6 * (end - start) / count:8.3f}us/record")
+    return result
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    dicts = make_record_dicts(count)
+    print(f"{count} records")
+
+    # tracemalloc slows down every allocation, so the memory is measured in a separate pass
+    gc.collect()
+    tracemalloc.start()
+    records = build_records(dicts)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    gc.collect()
+    records = timed("construct", count, lambda: build_records(dicts))
+    print(f"{'memory':<28}{size / 2**20:9.2f}MB {size / count:8.1f}B/record")
+
+    timed("format (first str())", count, lambda: format_records(records))
+    timed("format (cached str())", count, lambda: format_records(records))
+
+if __name__ == "__main__":
+    main()
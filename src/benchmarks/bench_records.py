@@ -0,0 +1,96 @@
+# bench_records.py
+# compares StrafesClient.make_record_list against the old make_record_list, which converted the records one at a time
+# with record_from_dict and looked every map up under the map lock
+# no requests are made, the maps and users are loaded into the client beforehand
+# the old path needs aiorwlock, which the bot used for the map lock before the catalog snapshot
+# run from the src directory: python -m benchmarks.bench_records [count]
+import asyncio
+import random
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from aiorwlock import RWLock
+
+from benchmarks.bench_models import make_record_dicts
+from modules.catalog import MapCatalog
+from modules.strafes import MapsNotLoadedError, StrafesClient
+from modules.strafes_base import *
+
+def make_map_dicts(count : int) -> List[Dict[str, Any]]:
+    random.seed(1)
+    return [{
+        "ID":i,
+        "DisplayName":f"bhop_benchmark_{i}",
+        "Creator":f"creator_{i % 100}",
+        "Game":random.randint(1, 2),
+        "Date":random.randint(1500000000, 1660000000),
+        "PlayCount":random.randint(0, 100000)
+    } for i in range(1, count + 1)]
+
+# the map lookup and record_from_dict as they were before the catalog snapshot: every map is looked up under
+# the reader lock of the maps
+class OldMaps:
+
+    def __init__(self, maps : List[Dict[str, Any]]):
+        self._map_lock = RWLock()
+        self._maps_loaded : bool = True
+        self._map_lookup : Dict[int, Map] = {d["ID"]: Map.from_dict(d) for d in maps}
+
+    async def map_from_id(self, map_id:int) -> Map:
+        async with self._map_lock.reader_lock:
+            if not self._maps_loaded:
+                raise MapsNotLoadedError()
+            try:
+                return self._map_lookup[map_id]
+            except KeyError:
+                return Map(-1, "Missing map", "", Game.BHOP, -1, -1)
+
+    async def record_from_dict(self, client : StrafesClient, d, user : User = None, map : Map = None) -> Record:
+        if not user:
+            user = await client.get_user_data(d["User"])
+        if not map:
+            map = await self.map_from_id(d["Map"])
+        return Record.from_dict(d, user, map)
+
+# the path make_record_list used to take: one batch of users, then one await (and map lookup) per record
+async def per_record(client : StrafesClient, old_maps : OldMaps, records : List[Dict[str, Any]]) -> List[Record]:
+    user_ids = set()
+    for record in records:
+        user_ids.add(record["User"])
+    id_to_user = await client.get_user_data_from_list(list(user_ids))
+    ls = []
+    for record in records:
+        ls.append(await old_maps.record_from_dict(client, record, user=id_to_user[record["User"]]))
+    return ls
+
+async def timed(name : str, count : int, func : Callable[[], Awaitable[Any]], repeat : int = 5) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        end = time.perf_counter()
+        if best is None or end - start < best:
+            best = end - start
+    print(f"{name:<28}{best:9.4f}s {1e6 * best / count:8.3f}us/record")
+    return best
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    records = make_record_dicts(count)
+    client = StrafesClient("")
+    try:
+        map_dicts = make_map_dicts(5000)
+        client._catalog = MapCatalog.build(map_dicts)
+        old_maps = OldMaps(map_dicts)
+        for user_id in {record["User"] for record in records}:
+            client._users.put(User.from_dict({"id":user_id, "name":f"user_{user_id}", "displayName":f"user_{user_id}"}))
+        print(f"{count} records")
+        old = await timed("old make_record_list", count, lambda: per_record(client, old_maps, records))
+        new = await timed("make_record_list", count, lambda: client.make_record_list(records))
+        print(f"{'speedup':<28}{old / new:9.2f}x")
+    finally:
+        await client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,333 @@
+# mock_api.py
+# a local stand-in for the strafes.net v1 api and the roblox/verify endpoints StrafesClient uses, for benchmarks
+# the data is generated from a seed so every run sees the same maps, users and times
+# run from the src directory to serve it on its own: python -m benchmarks.mock_api [port]
+import asyncio
+import io
+import random
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+from PIL import Image
+
+from modules.metrics import endpoint_label
+
+MAP_PAGE_SIZE = 100
+RANK_PAGE_SIZE = 50
+TIME_PAGE_SIZE = 200
+RECENT_WRS = 10
+# roblox ids of the generated users start here so they don't look like map or record ids
+USER_ID_OFFSET = 100000
+STYLES = range(1, 8)
+
+Rows = List[Dict[str, Any]]
+
+class MockData:
+
+    def __init__(self, maps : int = 1000, users : int = 5000, times : int = 50000, seed : int = 0):
+        rng = random.Random(seed)
+        self.maps : Rows = [{
+            "ID":i,
+            "DisplayName":f"{'bhop' if i % 5 < 3 else 'surf'}_mock_{i}",
+            "Creator":f"creator_{i % 97}",
+            "Game":1 if i % 5 < 3 else 2,
+            "Date":rng.randint(1500000000, 1660000000),
+            "PlayCount":rng.randint(0, 100000)
+        } for i in range(1, maps + 1)]
+        self.users : Dict[int, Dict[str, Any]] = {}
+        for i in range(users):
+            user_id = USER_ID_OFFSET + i
+            self.users[user_id] = {"id":user_id, "name":f"user_{i}", "displayName":f"User{i}"}
+        self.user_names = {user["name"].lower(): user for user in self.users.values()}
+
+        # users with low ids get most of the times so there are a few users with many pages of times
+        seen = set()
+        self.times : Rows = []
+        for record_id in range(1, times + 1):
+            user = USER_ID_OFFSET + int(users * rng.random() ** 3)
+            map = self.maps[rng.randrange(maps)]
+            style = 1 if rng.random() < 0.6 else rng.choice(STYLES)
+            if (user, map["ID"], style) in seen:
+                continue
+            seen.add((user, map["ID"], style))
+            self.times.append({
+                "ID":record_id,
+                "Time":rng.randint(5000, 600000),
+                "User":user,
+                "Map":map["ID"],
+                "Date":rng.randint(1500000000, 1660000000),
+                "Style":style,
+                "Mode":0,
+                "Game":map["Game"]
+            })
+
+        self.by_user : Dict[int, Rows] = {}
+        self.by_map : Dict[Tuple[int, int], Rows] = {}
+        for row in self.times:
+            self.by_user.setdefault(row["User"], []).append(row)
+            self.by_map.setdefault((row["Map"], row["Style"]), []).append(row)
+        for rows in self.by_user.values():
+            rows.sort(key=lambda i: (-i["Date"], -i["ID"]))
+        self.placements : Dict[int, int] = {}
+        self.wrs : Dict[Tuple[int, int], Rows] = {}
+        for rows in self.by_map.values():
+            rows.sort(key=lambda i: (i["Time"], i["Date"]))
+            for placement, row in enumerate(rows, 1):
+                self.placements[row["ID"]] = placement
+            self.wrs.setdefault((rows[0]["Game"], rows[0]["Style"]), []).append(rows[0])
+        for rows in self.wrs.values():
+            rows.sort(key=lambda i: -i["Date"])
+        self.wr_ids = {row["ID"] for rows in self.wrs.values() for row in rows}
+        self._ranks : Dict[Tuple[int, int], Tuple[Rows, Dict[int, Dict[str, Any]]]] = {}
+
+    # skill is the average of how close each of a user's times is to the top of its leaderboard
+    def ranks(self, game : int, style : int) -> Tuple[Rows, Dict[int, Dict[str, Any]]]:
+        key = (game, style)
+        if key not in self._ranks:
+            maps = sum(1 for map in self.maps if map["Game"] == game)
+            scores : Dict[int, float] = {}
+            for (_, map_style), rows in self.by_map.items():
+                if map_style != style or rows[0]["Game"] != game:
+                    continue
+                for placement, row in enumerate(rows):
+                    scores[row["User"]] = scores.get(row["User"], 0.0) + 1.0 - placement / len(rows)
+            rows = []
+            for placement, (user, score) in enumerate(sorted(scores.items(), key=lambda i: -i[1]), 1):
+                skill = score / max(1, maps)
+                rows.append({"ID":user, "User":user, "Game":game, "Style":style, "Rank":min(1.0, skill * 4), "Skill":skill, "Placement":placement})
+            self._ranks[key] = (rows, {row["User"]: row for row in rows})
+        return self._ranks[key]
+
+def _page(rows : Rows, page : int, page_size : int) -> Tuple[Rows, int]:
+    page_count = (len(rows) + page_size - 1) // page_size
+    return rows[(page - 1) * page_size:page * page_size], page_count
+
+def _int(request : web.Request, name : str, default : Optional[int] = None) -> Optional[int]:
+    value = request.query.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise web.HTTPBadRequest(text=f"Invalid {name}")
+
+# serves every api under one port:
+#   /v1/...                 strafes.net
+#   /users/v1/...           users.roblox.com
+#   /thumbnails/v1/...      thumbnails.roblox.com
+#   /verify/api/...         verify.eryn.io
+#   /images/...             the image urls the thumbnail endpoints hand out
+# latency: seconds added to every response, jitter: up to this many seconds more, chosen at random
+# ratelimit: strafes.net requests allowed per window seconds, over that requests get a 429
+# error_rate: the chance that any request gets a 429 anyway
+class MockAPI:
+
+    def __init__(self, data : MockData = None, host : str = "127.0.0.1", port : int = 0, latency : float = 0.05, jitter : float = 0.0,
+            ratelimit : int = 100000, window : float = 60.0, error_rate : float = 0.0, seed : int = 0):
+        self.data = data if data is not None else MockData(seed=seed)
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.ratelimit = ratelimit
+        self.window = window
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._window_start = time.monotonic()
+        self._window_used = 0
+        self._images : Dict[int, bytes] = {}
+        self._runner : Optional[web.AppRunner] = None
+        # requests received by endpoint (ids replaced like in the metrics), the ones answered with a 429 are also counted in ratelimited
+        self.calls : Counter = Counter()
+        self.ratelimited : int = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/"
+
+    # keyword arguments for StrafesClient that point it at this server
+    def client_urls(self) -> Dict[str, str]:
+        return {
+            "strafes_url":f"{self.base_url}v1/",
+            "users_url":f"{self.base_url}users/v1/",
+            "thumbnails_url":f"{self.base_url}thumbnails/v1/",
+            "verify_url":f"{self.base_url}verify/api/"
+        }
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def reset_counts(self):
+        self.calls.clear()
+        self.ratelimited = 0
+
+    def _ratelimit_headers(self) -> Dict[str, str]:
+        now = time.monotonic()
+        if now - self._window_start >= self.window:
+            self._window_start = now
+            self._window_used = 0
+        self._window_used += 1
+        reset = max(0.0, self.window - (now - self._window_start))
+        return {
+            "RateLimit-Limit":str(self.ratelimit),
+            "RateLimit-Remaining":str(max(0, self.ratelimit - self._window_used)),
+            "RateLimit-Reset":str(int(reset) + 1)
+        }
+
+    @web.middleware
+    async def _middleware(self, request : web.Request, handler) -> web.StreamResponse:
+        delay = self.latency + self._random.random() * self.jitter
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.calls[endpoint_label(request.path)] += 1
+        strafes = request.path.startswith("/v1/")
+        headers = self._ratelimit_headers() if strafes else {}
+        if (strafes and self._window_used > self.ratelimit) or self._random.random() < self.error_rate:
+            self.ratelimited += 1
+            if strafes:
+                headers["RateLimit-Remaining"] = "0"
+            return web.json_response({"error":"Too many requests"}, status=429, headers=headers)
+        try:
+            response = await handler(request)
+        except web.HTTPException as error:
+            error.headers.update(headers)
+            raise
+        response.headers.update(headers)
+        return response
+
+    @staticmethod
+    def _paged(rows : Rows, page : int, page_size : int) -> web.Response:
+        rows, page_count = _page(rows, page, page_size)
+        return web.json_response(rows, headers={"Pagination-Count":str(page_count)})
+
+    async def _maps(self, request : web.Request) -> web.Response:
+        game = _int(request, "game")
+        rows = [map for map in self.data.maps if game is None or map["Game"] == game]
+        return self._paged(rows, _int(request, "page", 1), MAP_PAGE_SIZE)
+
+    async def _ranks(self, request : web.Request) -> web.Response:
+        rows, _ = self.data.ranks(_int(request, "game", 1), _int(request, "style", 1))
+        return self._paged(rows, _int(request, "page", 1), RANK_PAGE_SIZE)
+
+    async def _user_rank(self, request : web.Request) -> web.Response:
+        _, by_user = self.data.ranks(_int(request, "game", 1), _int(request, "style", 1))
+        return web.json_response(by_user.get(int(request.match_info["user"]), {}))
+
+    def _user_rows(self, request : web.Request) -> Rows:
+        game, style, map = _int(request, "game"), _int(request, "style"), _int(request, "map")
+        return [row for row in self.data.by_user.get(int(request.match_info["user"]), ())
+            if (game is None or row["Game"] == game) and (style is None or row["Style"] == style) and (map is None or row["Map"] == map)]
+
+    async def _user_times(self, request : web.Request) -> web.Response:
+        return self._paged(self._user_rows(request), _int(request, "page", 1), TIME_PAGE_SIZE)
+
+    async def _user_wrs(self, request : web.Request) -> web.Response:
+        return web.json_response([row for row in self._user_rows(request) if row["ID"] in self.data.wr_ids])
+
+    async def _map_times(self, request : web.Request) -> web.Response:
+        rows = self.data.by_map.get((int(request.match_info["map"]), _int(request, "style", 1)), [])
+        return self._paged(rows, _int(request, "page", 1), TIME_PAGE_SIZE)
+
+    async def _recent_wrs(self, request : web.Request) -> web.Response:
+        rows = self.data.wrs.get((_int(request, "game", 1), _int(request, "style", 1)), [])
+        return web.json_response(rows[:RECENT_WRS])
+
+    async def _time_rank(self, request : web.Request) -> web.Response:
+        placement = self.data.placements.get(int(request.match_info["id"]))
+        if placement is None:
+            raise web.HTTPNotFound()
+        return web.json_response({"ID":int(request.match_info["id"]), "Rank":placement})
+
+    async def _user(self, request : web.Request) -> web.Response:
+        user = self.data.users.get(int(request.match_info["user"]))
+        if user is None:
+            raise web.HTTPNotFound()
+        return web.json_response({"ID":user["id"], "Username":user["name"], "State":0})
+
+    async def _roblox_users(self, request : web.Request) -> web.Response:
+        form = await request.post()
+        users = [self.data.users[int(i)] for i in form.getall("userIds", []) if int(i) in self.data.users]
+        return web.json_response({"data":users})
+
+    async def _roblox_usernames(self, request : web.Request) -> web.Response:
+        form = await request.post()
+        users = []
+        for name in form.getall("usernames", []):
+            user = self.data.user_names.get(str(name).lower())
+            if user is not None:
+                users.append({"requestedUsername":name, **user})
+        return web.json_response({"data":users})
+
+    def _thumbnail(self, ids : str) -> web.Response:
+        data = [{"targetId":int(i), "state":"Completed", "imageUrl":f"{self.base_url}images/{int(i) % 64}.png"} for i in ids.split(",") if i.isdigit()]
+        return web.json_response({"data":data})
+
+    async def _headshot(self, request : web.Request) -> web.Response:
+        return self._thumbnail(request.query.get("userIds", ""))
+
+    async def _asset(self, request : web.Request) -> web.Response:
+        return self._thumbnail(request.query.get("assetIds", ""))
+
+    async def _verify(self, request : web.Request) -> web.Response:
+        users = list(self.data.users)
+        user = self.data.users[users[int(request.match_info["discord"]) % len(users)]]
+        return web.json_response({"status":"ok", "robloxId":user["id"], "robloxUsername":user["name"]})
+
+    async def _image(self, request : web.Request) -> web.Response:
+        n = int(request.match_info["n"])
+        if n not in self._images:
+            image = Image.new("RGBA", (180, 180), ((n * 37) % 256, (n * 91) % 256, (n * 53) % 256, 255))
+            buffer = io.BytesIO()
+            image.save(buffer, "PNG")
+            self._images[n] = buffer.getvalue()
+        return web.Response(body=self._images[n], content_type="image/png")
+
+    def make_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/v1/map", self._maps)
+        app.router.add_get("/v1/rank", self._ranks)
+        app.router.add_get("/v1/rank/{user:\\d+}", self._user_rank)
+        app.router.add_get("/v1/time/recent/wr", self._recent_wrs)
+        app.router.add_get("/v1/time/user/{user:\\d+}", self._user_times)
+        app.router.add_get("/v1/time/user/{user:\\d+}/wr", self._user_wrs)
+        app.router.add_get("/v1/time/map/{map:\\d+}", self._map_times)
+        app.router.add_get("/v1/time/{id:\\d+}/rank", self._time_rank)
+        app.router.add_get("/v1/user/{user:\\d+}", self._user)
+        app.router.add_post("/users/v1/users", self._roblox_users)
+        app.router.add_post("/users/v1/usernames/users", self._roblox_usernames)
+        app.router.add_get("/thumbnails/v1/users/avatar-headshot", self._headshot)
+        app.router.add_get("/thumbnails/v1/assets", self._asset)
+        app.router.add_get("/verify/api/user/{discord:\\d+}", self._verify)
+        app.router.add_get("/images/{n:\\d+}.png", self._image)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # port 0 picks a free port, read back the one that was bound
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+async def main():
+    api = MockAPI(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8080)
+    await api.start()
+    print(f"Mock api listening on {api.base_url}")
+    for name, url in api.client_urls().items():
+        print(f"  {name}: {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())
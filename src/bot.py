@@ -9,11 +9,21 @@ import os
 import traceback
 import sys
 
-from modules import utils
+from modules import tracing, utils
 from modules.strafes import APIError
 
+# records the time spent sending replies in the command's trace
+class TracedContext(commands.Context):
+
+    async def send(self, *args, **kwargs) -> discord.Message:
+        with tracing.span("discord send"):
+            return await super().send(*args, **kwargs)
+
 class StrafesBot(commands.Bot):
 
+    async def get_context(self, origin, /, *, cls=TracedContext):
+        return await super().get_context(origin, cls=cls)
+
     async def on_ready(self):
         print(f"{self.user} has connected to Discord!")
         await self.change_presence(status=discord.Status.online, activity=discord.Game(name=f"{self.command_prefix}help"))
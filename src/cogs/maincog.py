@@ -1,24 +1,30 @@
 # maincog.py
 import asyncio
-import colorsys
+from collections import OrderedDict
 import discord
 from discord.ext.commands.context import Context
 from discord.ext.commands import Command
 from dotenv import load_dotenv
 from discord.ext import commands, tasks
 from io import BytesIO, StringIO
-import numpy
 import os
-from PIL import Image
 import time
 import traceback
-from typing import Callable, Coroutine, Dict, List, Tuple, Union
+from typing import Callable, Coroutine, Dict, List, Optional, Tuple, Union
 
 from modules.strafes_base import *
 from modules.strafes import APIError, StrafesClient
 from modules import utils
 from modules.utils import Incrementer, StringBuilder
 from modules.arguments import ArgumentValidator
+from modules.broadcast import Broadcaster
+from modules.channels import ChannelIndex
+from modules.compare import compare_times
+from modules import metrics
+from modules.images import compose_diagonal
+from modules.metrics import MetricsServer
+from modules.pagefetch import Priority, set_priority
+from modules import tracing
 
 # contains some commonly used Cols designed for use with MessageBuilder
 class MessageCol:
@@ -135,6 +141,15 @@ def before_strafes(max_allowed_per_user=1):
         return success
     return commands.check(before)
 
+MAX_CACHED_THUMBNAILS = 128
+# seconds after the bot is ready before the rank tables are first crawled
+RANK_CRAWL_DELAY = 10*60
+_COMMANDS = metrics.registry.counter("bot_commands_total", "Commands run by command and status.")
+_COMMAND_SECONDS = metrics.registry.histogram("bot_command_seconds", "Command latency by command.", (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0))
+_TASK_SECONDS = metrics.registry.histogram("bot_task_seconds", "Background task run time by task.", (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0))
+_TASK_ERRORS = metrics.registry.counter("bot_task_errors_total", "Background task runs that raised an error by task.")
+GLOBAL_CHANNELS = ("globals", "bhop-auto-globals", "bhop-styles-globals", "surf-auto-globals", "surf-styles-globals")
+
 # TODO: why do i have one cog for everything
 class MainCog(commands.Cog):
 
@@ -142,10 +157,14 @@ class MainCog(commands.Cog):
         self.bot : commands.Bot = bot
         self.bot.remove_command("help")
         self.strafes : StrafesClient = None
+        self.metrics_server : MetricsServer = None
         self.maps_started = False
         self.globals_started = False
         self.lock = asyncio.Lock()
         self.active_commands : Dict[int, UserActiveCommandManager] = {}
+        self.thumbnail_cache : OrderedDict[Tuple[int, int, str, str], bytes] = OrderedDict()
+        self.global_channels = ChannelIndex(GLOBAL_CHANNELS)
+        self.broadcaster = Broadcaster()
 
     async def cog_load(self):
         print("Loading maincog")
@@ -153,25 +172,47 @@ class MainCog(commands.Cog):
         self.strafes = StrafesClient(os.getenv("API_KEY"))
         print("Loading maps")
         start = time.monotonic()
-        await self.strafes.load_maps()
-        end = time.monotonic()
-        print(f"Done loading maps ({end-start:.3f}s)")
+        if await self.strafes.load_map_snapshot():
+            # the snapshot may be out of date, so let the first run of update_maps refresh it from the api
+            self.maps_started = True
+            end = time.monotonic()
+            print(f"Done loading maps from snapshot ({end-start:.3f}s)")
+        else:
+            await self.strafes.load_maps()
+            end = time.monotonic()
+            print(f"Done loading maps ({end-start:.3f}s)")
+        self.metrics_server = MetricsServer(port=int(os.getenv("METRICS_PORT", 9108)))
+        try:
+            await self.metrics_server.start()
+        except OSError as error:
+            print(f"Couldn't start the metrics server: {error}")
+        tracing.configure(os.getenv("TRACE_EXPORT", ""), os.getenv("TRACE_DIR", "files/traces"))
         self.update_maps.start()
+        self.update_ranks.start()
         self.global_announcements.start()
         print("Maincog loaded")
     
     async def cog_unload(self):
         print("Unloading maincog")
         self.global_announcements.cancel()
+        self.update_ranks.cancel()
         self.update_maps.cancel()
+        await self.broadcaster.close()
+        await self.metrics_server.stop()
         await self.strafes.close()
+        await tracing.exporter.close()
 
     async def task_wrapper(self, task : Coroutine[Any, Any, None], task_name : str):
+        # requests made by background tasks wait behind the ones made by commands
+        set_priority(Priority.BACKGROUND)
         # this is wrapped in a try-except because if this raises
         # an error the entire task stops and we don't want that :)
+        start = time.monotonic()
         try:
             await task
+            _TASK_SECONDS.observe(time.monotonic() - start, task=task_name)
         except Exception as error:
+            _TASK_ERRORS.inc(task=task_name)
             try:
                 await self.bot.wait_until_ready()
                 tb_channel = self.bot.get_channel(utils.TRACEBACK_CHANNEL)
@@ -185,18 +226,14 @@ class MainCog(commands.Cog):
         if not self.maps_started:
             self.maps_started = True
         else:
-            await self.strafes.load_maps()
+            changes = await self.strafes.refresh_maps()
+            if changes:
+                print(f"Maps updated:\n{changes}")
 
     @tasks.loop(minutes=60)
     async def update_maps(self):
         await self.task_wrapper(self.update_maps_task(), "update_maps")
 
-    async def try_except(self, coroutine):
-        try:
-            await coroutine
-        except:
-            pass
-
     async def create_global_embed(self, record : Record):
         return (record.game, record.style, await self.make_global_embed(record))
 
@@ -233,27 +270,66 @@ class MainCog(commands.Cog):
                     surf_auto.append(embed)
                 elif game == Game.SURF and style != Style.AUTOHOP:
                     surf_style.append(embed)
-            tasks = []
-            for guild in self.bot.guilds:
-                for ch in guild.text_channels:
-                    if ch.name == "globals":
-                        for _,_,embed in all_embeds:
-                            tasks.append(self.try_except(ch.send(embed=embed)))
-                    elif ch.name == "bhop-auto-globals":
-                        for embed in bhop_auto:
-                            tasks.append(self.try_except(ch.send(embed=embed)))
-                    elif ch.name == "bhop-styles-globals":
-                        for embed in bhop_style:
-                            tasks.append(self.try_except(ch.send(embed=embed)))
-                    elif ch.name == "surf-auto-globals":
-                        for embed in surf_auto:
-                            tasks.append(self.try_except(ch.send(embed=embed)))
-                    elif ch.name == "surf-styles-globals":
-                        for embed in surf_style:
-                            tasks.append(self.try_except(ch.send(embed=embed)))
-            await asyncio.gather(*tasks)
+            if not self.global_channels.built:
+                self.global_channels.rebuild(self.bot.guilds)
+            channel_embeds = [
+                ("globals", [embed for _,_,embed in all_embeds]),
+                ("bhop-auto-globals", bhop_auto),
+                ("bhop-styles-globals", bhop_style),
+                ("surf-auto-globals", surf_auto),
+                ("surf-styles-globals", surf_style)
+            ]
+            for name, embeds in channel_embeds:
+                if embeds:
+                    for ch in self.global_channels.get(name):
+                        self.broadcaster.post(ch, embeds)
             end = time.time()
-            print(f"embeds posted: {end-start}s")
+            print(f"embeds queued: {end-start}s, {self.broadcaster.depth} waiting to be posted")
+
+    # the global channels are indexed by name so announcements don't have to look through every channel
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self.global_channels.rebuild(self.bot.guilds)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild : discord.Guild):
+        self.global_channels.add_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild : discord.Guild):
+        self.global_channels.remove_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel : discord.abc.GuildChannel):
+        self.global_channels.add_channel(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before : discord.abc.GuildChannel, after : discord.abc.GuildChannel):
+        self.global_channels.add_channel(after)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel : discord.abc.GuildChannel):
+        self.global_channels.remove_channel(channel)
+
+    @tasks.loop(minutes=60)
+    async def update_ranks(self):
+        await self.task_wrapper(self.update_ranks_task(), "update_ranks")
+
+    # the first crawl waits until startup (maps, the wr feed, the first commands) is out of the way
+    @update_ranks.before_loop
+    async def before_update_ranks(self):
+        await self.bot.wait_until_ready()
+        await asyncio.sleep(RANK_CRAWL_DELAY)
+
+    async def update_ranks_task(self):
+        start = time.monotonic()
+        errors = await self.strafes.update_rank_tables()
+        end = time.monotonic()
+        print(f"Rank tables updated ({end-start:.1f}s, {len(errors)} failed)")
+        if errors:
+            # raised after the other tables were updated so task_wrapper still reports it
+            failed = ", ".join(f"{game}/{style}: {type(error).__name__}: {error}" for (game, style), error in errors.items())
+            raise RuntimeError(f"Couldn't update rank tables: {failed}")
 
     @tasks.loop(minutes=1)
     async def global_announcements(self):
@@ -265,7 +341,18 @@ class MainCog(commands.Cog):
         #we have to wait for the bot to on_ready() or we won't be able to find channels/guilds
         await self.bot.wait_until_ready()
 
+    async def cog_before_invoke(self, ctx : Context):
+        ctx.invoked_at = time.monotonic()
+        ctx.trace_span = tracing.start_trace(f"!{ctx.command.qualified_name}", user=ctx.author.id, guild=ctx.guild.id if ctx.guild else 0,
+            message=ctx.message.content)
+
     async def cog_after_invoke(self, ctx : Context):
+        if ctx.command is not None and hasattr(ctx, "invoked_at"):
+            command = ctx.command.qualified_name
+            _COMMAND_SECONDS.observe(time.monotonic() - ctx.invoked_at, command=command)
+            _COMMANDS.inc(command=command, status="error" if ctx.command_failed else "ok")
+        if hasattr(ctx, "trace_span"):
+            tracing.end_trace(ctx.trace_span, "command failed" if ctx.command_failed else None)
         try:
             if ctx.reset_strafes:
                 user = ctx.author.id
@@ -583,7 +670,11 @@ class MainCog(commands.Cog):
                 return
             elif page > page_count:
                 page = page_count
-            msg = MessageBuilder(title=f"Ranks [game: {game}, style: {style}, page: {page}/{page_count}]",
+            title = f"Ranks [game: {game}, style: {style}, page: {page}/{page_count}]"
+            age = self.strafes.get_rank_table_age(game, style)
+            if age is not None:
+                title += f" (updated {int(age // 60)} min ago)"
+            msg = MessageBuilder(title=title,
                 cols=[MessageCol.PLACEMENT, MessageCol.USERNAME, MessageCol.RANK, MessageCol.SKILL],
                 items=ranks
             ).build()
@@ -744,37 +835,8 @@ class MainCog(commands.Cog):
                 tasks.append(self.strafes.get_user_times(c.user, game, c.style, -1))
             times : List[Tuple[List[Record], int]] = await asyncio.gather(*tasks)
 
-            wins : List[List[Record]] = [[] for _ in users]
-            ties : List[Record] = []
-            not_shared : List[List[Record]] = [[] for _ in users]
-            combined : Dict[Map, List[Record]] = {}
-            for records, _ in times:
-                for record in records:
-                    if record.map in combined:
-                        combined[record.map].append(record)
-                    else:
-                        combined[record.map] = [record]
-            for records in combined.values():
-                if len(records) == 1:
-                    not_shared[self.record_to_idx(records[0], comparables)].append(records[0])
-                else:
-                    best = None
-                    tie = False
-                    for record in records:
-                        if best is None:
-                            best = record
-                        elif record.time.millis < best.time.millis:
-                            tie = False
-                            record.previous_record = best
-                            best = record
-                        elif record.time.millis == best.time.millis:
-                            tie = True
-                        elif best.previous_record is None or best.previous_record.time.millis > record.time.millis:
-                            best.previous_record = record
-                    if tie:
-                        ties.append(best)
-                    else:
-                        wins[self.record_to_idx(best, comparables)].append(best)
+            with tracing.span("compare times"):
+                wins, ties, not_shared = compare_times([records for records, _ in times])
             for ls in wins:
                 ls.sort(key=lambda i : i.map.displayname)
             ties.sort(key=lambda i : i.map.displayname)
@@ -789,40 +851,11 @@ class MainCog(commands.Cog):
             file = None
 
             if len(users) == 2:
-                tasks = [self.safe_get_user_headshot_url(users[0].id), self.safe_get_user_headshot_url(users[1].id)]
-                urls = await asyncio.gather(*tasks)
-                url1 = urls[0]
-                url2 = urls[1]
-                file = None
-                if url1 is not None and url2 is not None:
-                    try:
-                        tasks = [self.strafes.get_bytes(url1), self.strafes.get_bytes(url2)]
-                        images = await asyncio.gather(*tasks)
-                        img1 = Image.open(BytesIO(images[0]))
-                        img2 = Image.open(BytesIO(images[1]))
-                        pixels1 = numpy.asarray(img1)
-                        pixels2 = numpy.asarray(img2)
-                        # Create a new image by drawing a diagonal line between the two images and combining them
-                        new_pixels = [list(range(180)) for _ in range(180)]
-                        for i in range(180):
-                            for j in range(180):
-                                val = i + j
-                                if val < 177:
-                                    new_pixels[i][j] = pixels1[i][j]
-                                elif val > 183:
-                                    new_pixels[i][j] = pixels2[i][j]
-                                else:
-                                    r, g, b = colorsys.hsv_to_rgb(i / 180, 1, 1)
-                                    new_pixels[i][j] = numpy.asarray([r * 255, g * 255, b * 255, 255], dtype=numpy.uint8)
-                        new_image = Image.fromarray(numpy.array(new_pixels))
-                        # https://stackoverflow.com/questions/63209888/send-pillow-image-on-discord-without-saving-the-image
-                        with BytesIO() as image_binary:
-                            new_image.save(image_binary, "PNG")
-                            image_binary.seek(0)
-                            file = discord.File(fp=image_binary, filename="thumb.png")
-                            embed.set_thumbnail(url="attachment://thumb.png")
-                    except:
-                        pass
+                thumbnail = await self.get_compare_thumbnail(users[0], users[1])
+                if thumbnail is not None:
+                    # https://stackoverflow.com/questions/63209888/send-pillow-image-on-discord-without-saving-the-image
+                    file = discord.File(fp=BytesIO(thumbnail), filename="thumb.png")
+                    embed.set_thumbnail(url="attachment://thumb.png")
 
             msg = []
             if len(styles) == 1:
@@ -876,13 +909,35 @@ class MainCog(commands.Cog):
                     fname += ".txt"
                     await ctx.send(file=discord.File(f, filename=fname))
     
+    # returns a png of the two users' headshots split diagonally, or None if it couldn't be made
+    # thumbnails are cached by user and headshot so repeat comparisons skip the downloads and the drawing
+    async def get_compare_thumbnail(self, user1 : User, user2 : User) -> Optional[bytes]:
+        tasks = [self.safe_get_user_headshot_url(user1.id), self.safe_get_user_headshot_url(user2.id)]
+        url1, url2 = await asyncio.gather(*tasks)
+        if url1 is None or url2 is None:
+            return None
+        # the headshot urls have a random query string at the end so discord doesn't cache them
+        key = (user1.id, user2.id, url1.split("?")[0], url2.split("?")[0])
+        thumbnail = self.thumbnail_cache.get(key)
+        if thumbnail is not None:
+            self.thumbnail_cache.move_to_end(key)
+            return thumbnail
+        try:
+            tasks = [self.strafes.get_bytes(url1), self.strafes.get_bytes(url2)]
+            images = await asyncio.gather(*tasks)
+            with tracing.span("compose thumbnail"):
+                thumbnail = await asyncio.to_thread(compose_diagonal, images[0], images[1])
+        except Exception:
+            return None
+        self.thumbnail_cache[key] = thumbnail
+        while len(self.thumbnail_cache) > MAX_CACHED_THUMBNAILS:
+            self.thumbnail_cache.popitem(last=False)
+        return thumbnail
+
     def compare_formatter(self, record: Record) -> str:
         diff = (record.previous_record.time.millis - record.time.millis) / 1000.0
         return f"{record.previous_record.user.username} (+{diff:.3f}s)"
 
-    def record_to_idx(self, record : Record, comparables) -> int:
-        return comparables[ComparableUserStyle(record.user, record.style)]
-
     @commands.command(name="mapstatus")
     @before_strafes()
     async def map_status(self, ctx:Context, *args):
@@ -903,12 +958,10 @@ class MainCog(commands.Cog):
             completed_maps = set(i.map for i in records)
             incompleted_maps = []
             map_count = await self.strafes.get_map_count(game)
-            maps = await self.strafes.get_all_maps()
+            maps = await self.strafes.get_maps(game)
             for map in maps:
-                if map.game == game and map not in completed_maps:
-                    # TODO: binary search insert
+                if map not in completed_maps:
                     incompleted_maps.append(map)
-            incompleted_maps.sort(key=lambda i: i.displayname)
             msg = MessageBuilder(title=f"Incomplete maps for {user.username} [game: {game}, style: {style}] (total: {len(incompleted_maps)} / {map_count})",
                 cols=[MessageCol.Col("Map name", 30, lambda i: i.displayname)],
                 items=incompleted_maps
@@ -936,7 +989,6 @@ class MainCog(commands.Cog):
         if not the_maps:
             await ctx.send(utils.fmt_md_code(f"No maps found by '{creator}'."))
             return
-        the_maps.sort(key=lambda k: (k.game.name, k.displayname))
         cols = [MessageCol.Col("Map name", 30, lambda m: m.displayname),
                     MessageCol.Col("Creator", 35, lambda m: m.creator),
                     MessageCol.GAME,
@@ -1069,8 +1121,31 @@ class MainCog(commands.Cog):
     @commands.command(name="updatemaps")
     @commands.is_owner()
     async def update_maps_cmd(self, ctx:Context):
-        await self.strafes.load_maps()
-        await ctx.send(utils.fmt_md_code("Maps updated."))
+        changes = await self.strafes.refresh_maps()
+        for msg in utils.page_messages(f"Maps updated.\n{changes}"):
+            await ctx.send(utils.fmt_md_code(msg))
+
+    @commands.command(name="apistats")
+    @commands.is_owner()
+    async def api_stats(self, ctx:Context):
+        remaining, reset = await self.strafes.get_ratelimit_info()
+        calls, saved = self.strafes.get_coalesce_info()
+        depth, delivered, dropped, sent, retried, (p50, p95, worst) = self.broadcaster.info()
+        msg = f"strafes.net rate limit: {remaining} remaining, resets in {reset}s\nRequests made: {calls}, saved by coalescing: {saved}\n" \
+            f"Globals: {depth} queued, {delivered} delivered in {sent} messages, {dropped} dropped, {retried} retries\n" \
+            f"Globals latency: p50 {p50:.2f}s, p95 {p95:.2f}s, max {worst:.2f}s"
+        await ctx.send(utils.fmt_md_code(msg))
+
+    @commands.command(name="lasttrace")
+    @commands.is_owner()
+    async def last_trace(self, ctx:Context):
+        # this command's own trace isn't finished yet, so the newest one is the command before it
+        if len(tracing.exporter.recent) == 0:
+            await ctx.send(utils.fmt_md_code("No traces recorded yet."))
+            return
+        trace = tracing.exporter.recent[-1]
+        for msg in utils.page_messages(f"Trace {trace.trace_id}\n{trace.summary()}"):
+            await ctx.send(utils.fmt_md_code(msg))
 
     def get_ordinal(self, num:int) -> str:
         ordinal = "th"
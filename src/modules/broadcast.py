@@ -0,0 +1,117 @@
+# broadcast.py
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Tuple
+
+import discord
+
+# discord's limits for a single message
+MAX_EMBEDS = 10
+MAX_EMBED_CHARACTERS = 6000
+
+# delivers embeds to channels through one queue per channel
+# each channel's queue is drained by its own worker, which packs as many embeds as discord allows into each
+# message and sends them one message at a time, so a burst never has more than one message in flight per channel
+# (discord rate limits message sends per channel) and at most concurrency messages in flight overall
+# 429s and server errors are retried with backoff, other errors (ex. missing permissions) drop the message
+class Broadcaster:
+
+    def __init__(self, concurrency : int = 20, max_queue : int = 100, retries : int = 3, latency_samples : int = 1000):
+        self.max_queue = max_queue
+        self.retries = retries
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._queues : Dict[int, Deque[Tuple[discord.Embed, float]]] = {}
+        self._workers : Dict[int, asyncio.Task] = {}
+        self._latencies : Deque[float] = deque(maxlen=latency_samples)
+        self.sent : int = 0
+        self.delivered : int = 0
+        self.dropped : int = 0
+        self.retried : int = 0
+
+    @property
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def post(self, channel : discord.abc.Messageable, embeds : Iterable[discord.Embed]):
+        queue = self._queues.get(channel.id)
+        if queue is None:
+            queue = deque()
+            self._queues[channel.id] = queue
+        now = time.monotonic()
+        for embed in embeds:
+            queue.append((embed, now))
+        # a channel that can't keep up loses its oldest embeds rather than growing without bound
+        while len(queue) > self.max_queue:
+            queue.popleft()
+            self.dropped += 1
+        if channel.id not in self._workers:
+            self._workers[channel.id] = asyncio.ensure_future(self._worker(channel, queue))
+
+    @staticmethod
+    def _next_batch(queue : Deque[Tuple[discord.Embed, float]]) -> List[Tuple[discord.Embed, float]]:
+        batch = []
+        characters = 0
+        while queue and len(batch) < MAX_EMBEDS:
+            length = len(queue[0][0])
+            if batch and characters + length > MAX_EMBED_CHARACTERS:
+                break
+            batch.append(queue.popleft())
+            characters += length
+        return batch
+
+    async def _worker(self, channel : discord.abc.Messageable, queue : Deque[Tuple[discord.Embed, float]]):
+        try:
+            while queue:
+                batch = self._next_batch(queue)
+                if await self._send(channel, [embed for embed, _ in batch]):
+                    now = time.monotonic()
+                    self.delivered += len(batch)
+                    self._latencies.extend(now - queued for _, queued in batch)
+                else:
+                    self.dropped += len(batch)
+        finally:
+            # both are removed without awaiting anything in between so post() never adds to a queue without a worker
+            if not queue:
+                self._queues.pop(channel.id, None)
+            self._workers.pop(channel.id, None)
+
+    # returns whether the message was sent
+    async def _send(self, channel : discord.abc.Messageable, embeds : List[discord.Embed]) -> bool:
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    await channel.send(embeds=embeds)
+                self.sent += 1
+                return True
+            except discord.HTTPException as error:
+                if error.status != 429 and error.status < 500:
+                    return False
+            except (OSError, asyncio.TimeoutError):
+                pass
+            except Exception:
+                return False
+            if attempt < self.retries:
+                self.retried += 1
+                await asyncio.sleep(min(2 ** attempt, 30))
+        return False
+
+    # returns (queued embeds, delivered embeds, dropped embeds, messages sent, retries, latency percentiles (p50, p95, max) in seconds)
+    def info(self) -> Tuple[int, int, int, int, int, Tuple[float, float, float]]:
+        latencies = sorted(self._latencies)
+        if latencies:
+            percentiles = (latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], latencies[-1])
+        else:
+            percentiles = (0.0, 0.0, 0.0)
+        return self.depth, self.delivered, self.dropped, self.sent, self.retried, percentiles
+
+    # waits for every queue to be delivered
+    async def join(self):
+        while self._workers:
+            await asyncio.gather(*self._workers.values(), return_exceptions=True)
+
+    async def close(self):
+        for task in list(self._workers.values()):
+            task.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._queues.clear()
@@ -0,0 +1,300 @@
+# catalog.py
+import bisect
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from modules.ngram import NGramIndex
+from modules.strafes_base import DEFAULT_GAMES, Game, Map
+
+# the result of comparing a catalog against a new map list
+# renamed holds (old display name, map) pairs, updated holds maps where something other than the name changed (ex. play count)
+class MapChanges:
+    def __init__(self):
+        self.added : List[Map] = []
+        self.removed : List[Map] = []
+        self.renamed : List[Tuple[str, Map]] = []
+        self.updated : List[Map] = []
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.renamed or self.updated)
+
+    def __str__(self):
+        s = [f"Added: {len(self.added)}, removed: {len(self.removed)}, renamed: {len(self.renamed)}, updated: {len(self.updated)}"]
+        for map in self.added:
+            s.append(f"New map: {map.displayname} ({map.game})")
+        for map in self.removed:
+            s.append(f"Removed map: {map.displayname} ({map.game})")
+        for old_name, map in self.renamed:
+            s.append(f"Renamed map: {old_name} -> {map.displayname} ({map.game})")
+        return "\n".join(s)
+
+# the lookup structures for the maps of one game
+# pairs: (lowercase name, map) sorted by name, used for prefix searches
+# name_index: NGramIndex of pairs, used for substring searches
+# sorted_maps: maps sorted by display name, used for listing maps
+# names and display_names hold the sort keys of pairs and sorted_maps so they can be searched with bisect
+# (bisect's key argument needs python 3.10)
+class GameMaps:
+    def __init__(self):
+        self.pairs : List[Tuple[str, Map]] = []
+        self.names : List[str] = []
+        self.name_index = NGramIndex()
+        self.sorted_maps : List[Map] = []
+        self.display_names : List[str] = []
+
+    def copy(self) -> "GameMaps":
+        game_maps = GameMaps()
+        game_maps.pairs = list(self.pairs)
+        game_maps.names = list(self.names)
+        game_maps.name_index = self.name_index.copy()
+        game_maps.sorted_maps = list(self.sorted_maps)
+        game_maps.display_names = list(self.display_names)
+        return game_maps
+
+    # pairs must already be sorted by name
+    def set_pairs(self, pairs : List[Tuple[str, Map]]):
+        self.pairs = pairs
+        self.names = [name for name, _ in pairs]
+        for pair in pairs:
+            self.name_index.add(pair, pair[0])
+        self.sorted_maps = sorted((m for _, m in pairs), key=lambda m: m.displayname)
+        self.display_names = [m.displayname for m in self.sorted_maps]
+
+    def add(self, map : Map):
+        pair = (map.displayname.lower(), map)
+        idx = bisect.bisect_right(self.names, pair[0])
+        self.pairs.insert(idx, pair)
+        self.names.insert(idx, pair[0])
+        self.name_index.add(pair, pair[0])
+        idx = bisect.bisect_right(self.display_names, map.displayname)
+        self.sorted_maps.insert(idx, map)
+        self.display_names.insert(idx, map.displayname)
+
+    def remove(self, map : Map):
+        name = map.displayname.lower()
+        idx = bisect.bisect_left(self.names, name)
+        while idx < len(self.pairs) and self.names[idx] == name:
+            if self.pairs[idx][1] is map:
+                self.name_index.remove(self.pairs[idx], name)
+                del self.pairs[idx]
+                del self.names[idx]
+                break
+            idx += 1
+        idx = bisect.bisect_left(self.display_names, map.displayname)
+        while idx < len(self.sorted_maps) and self.display_names[idx] == map.displayname:
+            if self.sorted_maps[idx] is map:
+                del self.sorted_maps[idx]
+                del self.display_names[idx]
+                break
+            idx += 1
+
+# an immutable snapshot of every map
+# a catalog is never modified once it has been built, updates build a new catalog (sharing whatever didn't change)
+# which is then published by replacing the reference to the old one, so readers never need a lock
+class MapCatalog:
+
+    def __init__(self):
+        self.version : int = 0
+        self._raw : Dict[int, Dict[str, Any]] = {}
+        self._lookup : Dict[int, Map] = {}
+        self._games : Dict[Game, GameMaps] = {game: GameMaps() for game in DEFAULT_GAMES}
+        self._sorted_maps : Tuple[Map, ...] = ()
+        self._creator_lookup : Dict[str, List[Map]] = {}
+        self._creator_index = NGramIndex()
+
+    # raw_maps: map dicts as returned by the api
+    @staticmethod
+    def build(raw_maps : Iterable[Dict[str, Any]], version : int = 1) -> "MapCatalog":
+        catalog = MapCatalog()
+        catalog.version = version
+        for m in raw_maps:
+            map = Map.from_dict(m)
+            if map.game not in catalog._games:
+                continue
+            catalog._raw[map.id] = m
+            catalog._lookup[map.id] = map
+            catalog._games[map.game].pairs.append((map.displayname.lower(), map))
+        for game_maps in catalog._games.values():
+            game_maps.set_pairs(sorted(game_maps.pairs, key=lambda i: i[0]))
+        catalog._finish()
+        for map in catalog._sorted_maps:
+            creator = map.creator.lower()
+            if creator in catalog._creator_lookup:
+                catalog._creator_lookup[creator].append(map)
+            else:
+                catalog._creator_lookup[creator] = [map]
+        for creator in catalog._creator_lookup:
+            catalog._creator_index.add(creator, creator)
+        return catalog
+
+    def _finish(self):
+        self._sorted_maps = tuple(m for game in sorted(self._games, key=lambda g: g.name) for m in self._games[game].sorted_maps)
+
+    def _copy(self) -> "MapCatalog":
+        catalog = MapCatalog()
+        catalog.version = self.version + 1
+        catalog._raw = dict(self._raw)
+        catalog._lookup = dict(self._lookup)
+        catalog._games = {game: game_maps.copy() for game, game_maps in self._games.items()}
+        catalog._creator_lookup = dict(self._creator_lookup)
+        catalog._creator_index = self._creator_index.copy()
+        return catalog
+
+    # these may only be called on a catalog that hasn't been published yet
+    def _add(self, map : Map, raw : Dict[str, Any]):
+        self._raw[map.id] = raw
+        self._lookup[map.id] = map
+        self._games[map.game].add(map)
+        creator = map.creator.lower()
+        # the lists are shared with the previous catalog so they are replaced rather than modified
+        maps = list(self._creator_lookup.get(creator, ()))
+        if not maps:
+            self._creator_index.add(creator, creator)
+        key = (map.game.name, map.displayname)
+        maps.insert(bisect.bisect_right([(m.game.name, m.displayname) for m in maps], key), map)
+        self._creator_lookup[creator] = maps
+
+    def _remove(self, map : Map):
+        del self._raw[map.id]
+        del self._lookup[map.id]
+        self._games[map.game].remove(map)
+        creator = map.creator.lower()
+        maps = [m for m in self._creator_lookup.get(creator, ()) if m is not map]
+        if maps:
+            self._creator_lookup[creator] = maps
+        else:
+            self._creator_lookup.pop(creator, None)
+            self._creator_index.remove(creator, creator)
+
+    # compares the catalog against a new list of raw maps and returns a new catalog with only the
+    # differences applied along with the differences, if nothing changed the same catalog is returned
+    def update(self, raw_maps : Iterable[Dict[str, Any]]) -> Tuple["MapCatalog", MapChanges]:
+        changes = MapChanges()
+        to_remove : List[Map] = []
+        to_add : List[Tuple[Map, Dict[str, Any]]] = []
+        seen = set()
+        for m in raw_maps:
+            map_id = m["ID"]
+            seen.add(map_id)
+            old = self._raw.get(map_id)
+            if old == m:
+                continue
+            map = Map.from_dict(m)
+            if map.game not in self._games:
+                continue
+            if old is None:
+                changes.added.append(map)
+            else:
+                old_map = self._lookup[map_id]
+                to_remove.append(old_map)
+                if map.displayname != old_map.displayname or map.game != old_map.game:
+                    changes.renamed.append((old_map.displayname, map))
+                else:
+                    changes.updated.append(map)
+            to_add.append((map, m))
+        if len(seen) - len(changes.added) != len(self._raw):
+            for map_id, map in self._lookup.items():
+                if map_id not in seen:
+                    to_remove.append(map)
+                    changes.removed.append(map)
+        if not changes:
+            return self, changes
+        catalog = self._copy()
+        for map in to_remove:
+            catalog._remove(map)
+        for map, m in to_add:
+            catalog._add(map, m)
+        catalog._finish()
+        return catalog, changes
+
+    # ls should be sorted
+    # performs an iterative binary search
+    # returns the first index where the item was found according to the compare function
+    @staticmethod
+    def _find_item(ls, compare) -> int:
+        left = 0
+        right = len(ls) - 1
+        while left <= right:
+            middle = (left + right) // 2
+            res = compare(ls[middle])
+            if res == 0:
+                return middle
+            elif res < 0:
+                left = middle + 1
+            else:
+                right = middle - 1
+        return -1
+
+    @staticmethod
+    def _compare_maps(name : str, map_name : str) -> int:
+        if map_name.startswith(name):
+            return 0
+        elif map_name < name:
+            return -1
+        else:
+            return 1
+
+    # index is an NGramIndex of the pairs in ls, if given it's used to narrow down substring matches
+    @staticmethod
+    def _map_from_name(name : str, ls : List[Tuple[str, Map]], index : NGramIndex = None) -> Optional[Map]:
+        name = name.lower()
+        idx = MapCatalog._find_item(ls, lambda m : MapCatalog._compare_maps(name, m[0]))
+        if idx != -1:
+            while idx > 0:
+                if ls[idx-1][0].startswith(name):
+                    idx -= 1
+                else:
+                    break
+            return ls[idx][1]
+        else:
+            # shortest name containing the search wins, ties go to the name that comes first alphabetically
+            candidates = index.candidates(name) if index is not None else None
+            if candidates is None:
+                candidates = ls
+            the_map = None
+            shortest_name = None
+            for map_name, m in candidates:
+                if name in map_name and (shortest_name is None or (len(map_name), map_name) < (len(shortest_name), shortest_name)):
+                    shortest_name = map_name
+                    the_map = m
+            return the_map
+
+    # game=None searches every game in order
+    def map_from_name(self, map_name : str, game : Optional[Game]) -> Optional[Map]:
+        games = DEFAULT_GAMES if game is None else [game]
+        for g in games:
+            game_maps = self._games.get(g)
+            if game_maps is not None:
+                res = self._map_from_name(map_name, game_maps.pairs, game_maps.name_index)
+                if res is not None:
+                    return res
+        return None
+
+    def map_from_id(self, map_id : int) -> Optional[Map]:
+        return self._lookup.get(map_id)
+
+    def map_count(self, game : Game) -> int:
+        game_maps = self._games.get(game)
+        return 1 if game_maps is None else len(game_maps.pairs)
+
+    # returns the maps sorted by (game, name)
+    def maps_by_creator(self, creator : Optional[str]) -> Sequence[Map]:
+        if not creator:
+            return self._sorted_maps
+        creator = creator.lower()
+        candidates = self._creator_index.candidates(creator)
+        if candidates is None:
+            candidates = self._creator_lookup.keys()
+        matches = []
+        for map_creator in candidates:
+            if creator in map_creator:
+                matches += self._creator_lookup[map_creator]
+        matches.sort(key=lambda m: (m.game.name, m.displayname))
+        return matches
+
+    # returns the maps of a game sorted by name
+    def maps(self, game : Game) -> Sequence[Map]:
+        game_maps = self._games.get(game)
+        return () if game_maps is None else game_maps.sorted_maps
+
+    def all_maps(self) -> Sequence[Map]:
+        return self._sorted_maps
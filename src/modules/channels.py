@@ -0,0 +1,56 @@
+# channels.py
+from typing import Dict, Iterable, List, Set
+
+import discord
+
+# keeps track of the text channels with one of the given names across every guild, so finding the
+# channels to post in doesn't require looking at every channel of every guild
+# the channel objects are updated in place by discord.py, so they're kept as long as the name still matches
+class ChannelIndex:
+
+    def __init__(self, names : Iterable[str]):
+        self._channels : Dict[str, Dict[int, discord.TextChannel]] = {name: {} for name in names}
+        # channel id -> the name it's indexed under
+        self._names : Dict[int, str] = {}
+        self._guilds : Dict[int, Set[int]] = {}
+        self.built = False
+
+    def add_channel(self, channel : discord.abc.GuildChannel):
+        name = self._names.get(channel.id)
+        if name is not None and name != channel.name:
+            self.remove_channel(channel)
+        if isinstance(channel, discord.TextChannel) and channel.name in self._channels:
+            self._channels[channel.name][channel.id] = channel
+            self._names[channel.id] = channel.name
+            self._guilds.setdefault(channel.guild.id, set()).add(channel.id)
+
+    def remove_channel(self, channel : discord.abc.GuildChannel):
+        name = self._names.pop(channel.id, None)
+        if name is not None:
+            del self._channels[name][channel.id]
+            guild_channels = self._guilds.get(channel.guild.id)
+            if guild_channels is not None:
+                guild_channels.discard(channel.id)
+                if not guild_channels:
+                    del self._guilds[channel.guild.id]
+
+    def add_guild(self, guild : discord.Guild):
+        for channel in guild.text_channels:
+            self.add_channel(channel)
+
+    def remove_guild(self, guild : discord.Guild):
+        for channel_id in self._guilds.pop(guild.id, ()):
+            name = self._names.pop(channel_id)
+            del self._channels[name][channel_id]
+
+    def rebuild(self, guilds : Iterable[discord.Guild]):
+        for channels in self._channels.values():
+            channels.clear()
+        self._names.clear()
+        self._guilds.clear()
+        for guild in guilds:
+            self.add_guild(guild)
+        self.built = True
+
+    def get(self, name : str) -> List[discord.TextChannel]:
+        return list(self._channels[name].values())
@@ -0,0 +1,46 @@
+# compare.py
+from typing import List, Sequence, Tuple
+import numpy
+
+from modules.strafes_base import Record
+
+# compares the times of any number of participants (each list is one participant's times, at most one per map)
+# returns (wins, ties, not_shared):
+#   wins[i]: maps where participant i has the best time, previous_record is set to the runner up
+#   ties: the first participant's record on maps where the best time is shared
+#   not_shared[i]: maps only participant i has completed
+# ties between participants are broken by the order they were given in, like the rest of the bot
+def compare_times(times : Sequence[Sequence[Record]]) -> Tuple[List[List[Record]], List[Record], List[List[Record]]]:
+    wins : List[List[Record]] = [[] for _ in times]
+    ties : List[Record] = []
+    not_shared : List[List[Record]] = [[] for _ in times]
+    records = [record for ls in times for record in ls]
+    if not records:
+        return wins, ties, not_shared
+
+    owners = numpy.repeat(numpy.arange(len(times)), [len(ls) for ls in times])
+    map_ids = numpy.fromiter((record.map.id for record in records), dtype=numpy.int64, count=len(records))
+    millis = numpy.fromiter((record.time.millis for record in records), dtype=numpy.int64, count=len(records))
+
+    # group the records by map, fastest first, then by participant
+    order = numpy.lexsort((owners, millis, map_ids))
+    sorted_maps = map_ids[order]
+    sorted_millis = millis[order]
+    starts = numpy.flatnonzero(numpy.concatenate(([True], sorted_maps[1:] != sorted_maps[:-1])))
+    sizes = numpy.diff(numpy.append(starts, len(order)))
+
+    # the first record of each group is the best time, the second is the runner up
+    shared = starts[sizes > 1]
+    tied = sorted_millis[shared + 1] == sorted_millis[shared]
+    won = shared[~tied]
+
+    owners_list = owners.tolist()
+    for i in order[starts[sizes == 1]].tolist():
+        not_shared[owners_list[i]].append(records[i])
+    for i in order[shared[tied]].tolist():
+        ties.append(records[i])
+    for best, runner_up in zip(order[won].tolist(), order[won + 1].tolist()):
+        record = records[best]
+        record.previous_record = records[runner_up]
+        wins[owners_list[best]].append(record)
+    return wins, ties, not_shared
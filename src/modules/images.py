@@ -0,0 +1,31 @@
+# images.py
+import colorsys
+from io import BytesIO
+import numpy
+from PIL import Image
+
+THUMBNAIL_SIZE = 180
+
+# a diagonal line splits the thumbnail, pixels with row + column below LINE_START come from
+# the first image, above LINE_END from the second, and the rest are colored by their row's hue
+_LINE_START = 177
+_LINE_END = 183
+_rows, _cols = numpy.indices((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+_FIRST_MASK = (_rows + _cols < _LINE_START)[..., None]
+_SECOND_MASK = (_rows + _cols > _LINE_END)[..., None]
+_LINE_COLORS = numpy.array([[r * 255, g * 255, b * 255, 255] for r, g, b in (colorsys.hsv_to_rgb(i / THUMBNAIL_SIZE, 1, 1) for i in range(THUMBNAIL_SIZE))]).astype(numpy.uint8)
+_LINE = numpy.broadcast_to(_LINE_COLORS[:, None, :], (THUMBNAIL_SIZE, THUMBNAIL_SIZE, 4))
+
+def _load(image_bytes : bytes) -> numpy.ndarray:
+    img = Image.open(BytesIO(image_bytes)).convert("RGBA")
+    if img.size != (THUMBNAIL_SIZE, THUMBNAIL_SIZE):
+        img = img.resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    return numpy.asarray(img)
+
+# combines two headshots into one png split by a rainbow diagonal line
+# this is CPU bound so it should be run off the event loop (ex. asyncio.to_thread)
+def compose_diagonal(image1 : bytes, image2 : bytes) -> bytes:
+    pixels = numpy.where(_FIRST_MASK, _load(image1), numpy.where(_SECOND_MASK, _load(image2), _LINE))
+    with BytesIO() as image_binary:
+        Image.fromarray(pixels).save(image_binary, "PNG")
+        return image_binary.getvalue()
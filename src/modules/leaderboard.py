@@ -0,0 +1,158 @@
+# leaderboard.py
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+# sorts times from a map leaderboard, the api's pages aren't always sorted correctly across page boundaries
+def sort_map_rows(rows : List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return sorted(rows, key=lambda i: (i["Time"], i["Date"]))
+
+# the cached pages (200 times each) of one map/style leaderboard as returned by the api
+class Leaderboard:
+
+    def __init__(self):
+        self.page_count : int = 0
+        self._pages : Dict[int, Tuple[float, List[Dict[str, Any]]]] = {}
+
+    def get_page(self, page : int, max_age : float) -> Optional[List[Dict[str, Any]]]:
+        cached = self._pages.get(page)
+        if cached is None or time.monotonic() - cached[0] > max_age:
+            return None
+        return cached[1]
+
+    # page_count is ignored for empty pages after the first
+    def set_page(self, page : int, rows : List[Dict[str, Any]], page_count : int):
+        if page > 1 and len(rows) == 0:
+            # the api counted a page that turned out to be empty (ex. times were removed), so the leaderboard ends before it
+            if page <= self.page_count:
+                self.page_count = page - 1
+                for p in [p for p in self._pages if p >= page]:
+                    del self._pages[p]
+            return
+        if page == 1:
+            old = self._pages.get(1)
+            # a new time in the top 200 (or a different page count) shifts every page after it
+            if page_count != self.page_count or old is None or self._changed(old[1], rows):
+                self._pages.clear()
+            self.page_count = page_count
+        elif page_count != self.page_count:
+            self._pages.clear()
+            self.page_count = page_count
+        self._pages[page] = (time.monotonic(), rows)
+
+    @staticmethod
+    def _changed(old : List[Dict[str, Any]], new : List[Dict[str, Any]]) -> bool:
+        if len(old) != len(new):
+            return True
+        for a, b in zip(old, new):
+            if a["ID"] != b["ID"] or a["Time"] != b["Time"]:
+                return True
+        return False
+
+    # returns (placement, row) of a time if its placement can be known from the cached pages
+    # rows near the end of the last cached page could still be displaced by rows of the next page, so
+    # those are only trusted when every page is cached
+    def placement(self, record_id : int, max_age : float) -> Optional[Tuple[int, Dict[str, Any]]]:
+        rows = []
+        page = 1
+        while page <= self.page_count:
+            page_rows = self.get_page(page, max_age)
+            if page_rows is None:
+                break
+            rows += page_rows
+            page += 1
+        complete = page > self.page_count
+        rows = sort_map_rows(rows)
+        trusted = len(rows) if complete else len(rows) - 200
+        for i in range(max(0, trusted)):
+            if rows[i]["ID"] == record_id:
+                return i + 1, rows[i]
+        return None
+
+# LRU cache of leaderboards keyed by (map id, style)
+# ttl: how long pages are kept, top_ttl: how long the first page is kept, new times show up there first
+class LeaderboardCache:
+
+    def __init__(self, ttl : float = 10*60, top_ttl : float = 60, max_boards : int = 512):
+        self.ttl = ttl
+        self.top_ttl = top_ttl
+        self.max_boards = max_boards
+        self._boards : "OrderedDict[Hashable, Leaderboard]" = OrderedDict()
+
+    def get(self, key : Hashable) -> Leaderboard:
+        board = self._boards.get(key)
+        if board is None:
+            board = Leaderboard()
+            self._boards[key] = board
+            while len(self._boards) > self.max_boards:
+                self._boards.popitem(last=False)
+        else:
+            self._boards.move_to_end(key)
+        return board
+
+    def max_age(self, page : int) -> float:
+        return self.top_ttl if page == 1 else self.ttl
+
+# the best few times of each (map id, style), used to find the previous WR when a new one is set
+# entries come from fresh first pages of a leaderboard and the WR feed, and are only trusted when they're consistent
+# entries seeded from the WR feed aren't confirmed by a leaderboard, they're only valid for the poll that seeded them
+# and are dropped with drop_unconfirmed() once it's done
+# ttl should be no longer than the first page is cached for, a WR can be deleted or replaced without the feed seeing it
+class TopTimesCache:
+
+    def __init__(self, size : int = 5, ttl : float = 60, max_entries : int = 8192):
+        self.size = size
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (time, rows, confirmed)
+        self._entries : "OrderedDict[Hashable, Tuple[float, List[Dict[str, Any]], bool]]" = OrderedDict()
+        self.hits : int = 0
+        self.misses : int = 0
+
+    def _put(self, key : Hashable, rows : List[Dict[str, Any]], confirmed : bool, added : Optional[float] = None):
+        self._entries[key] = (time.monotonic() if added is None else added, rows, confirmed)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key : Hashable) -> Optional[List[Dict[str, Any]]]:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    # rows: the first page of the leaderboard
+    def set_page(self, key : Hashable, rows : List[Dict[str, Any]]):
+        self._put(key, sort_map_rows(rows[:20])[:self.size], True)
+
+    # row is the current WR according to the WR feed, it's only used if nothing is known about the map yet
+    # it should be a row the api still lists, a stored one may have been deleted since
+    def seed(self, key : Hashable, row : Dict[str, Any]):
+        if self.get(key) is None:
+            self._put(key, [row], False)
+
+    def drop_unconfirmed(self):
+        for key in [key for key, entry in self._entries.items() if not entry[2]]:
+            del self._entries[key]
+
+    # puts a new WR in first place, if it doesn't beat the cached first place the entry is dropped
+    def add_wr(self, key : Hashable, row : Dict[str, Any]):
+        rows = self.get(key)
+        if rows is None:
+            return
+        rows = [row] + [r for r in rows if r["ID"] != row["ID"]]
+        if len(rows) > 1 and (rows[1]["Time"], rows[1]["Date"]) < (row["Time"], row["Date"]):
+            del self._entries[key]
+            return
+        # keeps the time of the entry, adding a WR doesn't make the rest of it any more up to date
+        added, _, confirmed = self._entries[key]
+        self._put(key, rows[:self.size], confirmed, added)
+
+    # returns (first place, second place) if record_id is the cached first place and there is a second place
+    def top_two(self, key : Hashable, record_id : int, time : int) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        rows = self.get(key)
+        if rows is None or len(rows) < 2 or rows[0]["ID"] != record_id or rows[0]["Time"] != time:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return rows[0], rows[1]
@@ -0,0 +1,227 @@
+# metrics.py
+import asyncio
+import bisect
+import math
+import re
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+# a minimal prometheus client: counters, gauges and histograms rendered in the text exposition format
+# https://prometheus.io/docs/instrumenting/exposition_formats/
+
+Labels = Tuple[Tuple[str, str], ...]
+# (metric name, labels, value), returned by collectors at scrape time
+Sample = Tuple[str, Dict[str, str], float]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+
+def _labels(labels : Dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape(value : str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels : Iterable[Tuple[str, str]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+def _format_value(value : float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name : str, help : str):
+        self.name = name
+        self.help = help
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name : str, help : str):
+        super().__init__(name, help)
+        self._values : Dict[Labels, float] = {}
+
+    def inc(self, amount : float = 1, **labels):
+        key = _labels(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(labels)} {_format_value(value)}" for labels, value in self._values.items()]
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def __init__(self, name : str, help : str):
+        super().__init__(name, help)
+        self._values : Dict[Labels, float] = {}
+
+    def set(self, value : float, **labels):
+        self._values[_labels(labels)] = value
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(labels)} {_format_value(value)}" for labels, value in self._values.items()]
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name : str, help : str, buckets : Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (bucket counts, sum, count)
+        self._values : Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value : float, **labels):
+        key = _labels(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = ([0] * len(self.buckets), [0.0, 0])
+            self._values[key] = entry
+        counts, totals = entry
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(counts):
+            counts[i] += 1
+        totals[0] += value
+        totals[1] += 1
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, (total, count)) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+# holds every metric, collectors are called on every scrape for values that are read rather than recorded
+# (ex. cache sizes), they return samples that are rendered as gauges
+class Registry:
+
+    def __init__(self):
+        self._metrics : Dict[str, _Metric] = {}
+        self._collectors : List[Callable[[], Iterable[Sample]]] = []
+        self._help : Dict[str, str] = {}
+
+    def _get(self, cls, name : str, help : str, *args) -> _Metric:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = cls(name, help, *args)
+            self._metrics[name] = metric
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} is already registered as a {metric.type}")
+        return metric
+
+    def counter(self, name : str, help : str) -> Counter:
+        return self._get(Counter, name, help)
+
+    def gauge(self, name : str, help : str) -> Gauge:
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name : str, help : str, buckets : Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets)
+
+    # help: descriptions of the metric names the collector returns
+    def add_collector(self, collector : Callable[[], Iterable[Sample]], help : Dict[str, str] = {}):
+        self._collectors.append(collector)
+        self._help.update(help)
+
+    def remove_collector(self, collector : Callable[[], Iterable[Sample]]):
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines += metric.render()
+        collected : Dict[str, List[str]] = {}
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                collected.setdefault(name, []).append(f"{name}{_format_labels(_labels(labels))} {_format_value(value)}")
+        for name, samples in collected.items():
+            lines.append(f"# HELP {name} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {name} gauge")
+            lines += samples
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+# turns a url into a label that doesn't contain ids, ex. https://api.strafes.net/v1/time/user/123 -> api.strafes.net/v1/time/user/:id
+def endpoint_label(url : str) -> str:
+    url = url.split("?", 1)[0].split("://", 1)[-1]
+    return _ID_SEGMENT.sub("/:id", url)
+
+# measures how late the event loop wakes up from a sleep, which is how long something blocked it
+class LoopLagMonitor:
+
+    def __init__(self, interval : float = 0.5):
+        self.interval = interval
+        self.lag : float = 0.0
+        self._task : Optional[asyncio.Task] = None
+        self._histogram = registry.histogram("event_loop_lag_seconds", "How late the event loop woke up from a sleep.",
+            (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+        self._gauge = registry.gauge("event_loop_lag_seconds_last", "The most recent event loop lag measurement.")
+
+    async def _run(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, time.monotonic() - start - self.interval)
+            self._histogram.observe(self.lag)
+            self._gauge.set(self.lag)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# serves GET /metrics in the prometheus text format
+class MetricsServer:
+
+    def __init__(self, host : str = "127.0.0.1", port : int = 9108):
+        self.host = host
+        self.port = port
+        self._runner : Optional[web.AppRunner] = None
+        self.loop_lag = LoopLagMonitor()
+
+    async def _metrics(self, request : web.Request) -> web.Response:
+        return web.Response(body=registry.render().encode(), headers={"Content-Type":"text/plain; version=0.0.4; charset=utf-8"})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.loop_lag.start()
+
+    async def stop(self):
+        await self.loop_lag.stop()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
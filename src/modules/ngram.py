@@ -0,0 +1,73 @@
+# ngram.py
+from typing import Dict, Hashable, Optional, Set
+
+# maps every n character substring of a text to the keys whose text contains it, which allows
+# substring searches without scanning every text: any text containing the query must contain
+# every n-gram of the query, so intersecting those sets gives a small list of candidates to check
+class NGramIndex:
+
+    def __init__(self, n : int = 3):
+        self.n = n
+        self._grams : Dict[str, Set[Hashable]] = {}
+        # grams whose sets belong to this index, None if all of them do (see copy())
+        self._owned : Optional[Set[str]] = None
+
+    def _split(self, text : str) -> Set[str]:
+        return {text[i:i+self.n] for i in range(len(text) - self.n + 1)}
+
+    def _keys(self, gram : str) -> Optional[Set[Hashable]]:
+        keys = self._grams.get(gram)
+        if keys is not None and self._owned is not None and gram not in self._owned:
+            keys = set(keys)
+            self._grams[gram] = keys
+            self._owned.add(gram)
+        return keys
+
+    def add(self, key : Hashable, text : str):
+        for gram in self._split(text):
+            keys = self._keys(gram)
+            if keys is None:
+                self._grams[gram] = {key}
+                if self._owned is not None:
+                    self._owned.add(gram)
+            else:
+                keys.add(key)
+
+    def remove(self, key : Hashable, text : str):
+        for gram in self._split(text):
+            keys = self._keys(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._grams[gram]
+
+    def clear(self):
+        self._grams.clear()
+        self._owned = None
+
+    # copies are cheap: the sets are shared with the original and only copied once they are modified
+    # the original must not be modified after it has been copied
+    def copy(self) -> "NGramIndex":
+        index = NGramIndex(self.n)
+        index._grams = dict(self._grams)
+        index._owned = set()
+        return index
+
+    # returns a superset of the keys whose text contains query, the caller still has to check each one
+    # returns None if the query is too short to use the index
+    def candidates(self, query : str) -> Optional[Set[Hashable]]:
+        if len(query) < self.n:
+            return None
+        postings = []
+        for gram in self._split(query):
+            keys = self._grams.get(gram)
+            if keys is None:
+                return set()
+            postings.append(keys)
+        postings.sort(key=len)
+        result = set(postings[0])
+        for keys in postings[1:]:
+            result.intersection_update(keys)
+            if not result:
+                break
+        return result
@@ -0,0 +1,81 @@
+# pagefetch.py
+import asyncio
+import heapq
+import itertools
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Awaitable, Callable, Iterable, List, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# lower values go first
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+# the priority of whatever the current task is doing, tasks started from it inherit it
+current_priority : ContextVar[Priority] = ContextVar("current_priority", default=Priority.INTERACTIVE)
+
+def set_priority(priority : Priority):
+    current_priority.set(priority)
+
+# fetches many pages with at most concurrency requests in flight across every caller
+# when all slots are taken, waiting requests are started in priority order (then in the order they arrived)
+# so a command doesn't wait behind the pages of a background task
+class PageFetcher:
+
+    def __init__(self, concurrency : int = 8):
+        self.concurrency = concurrency
+        self._active : int = 0
+        self._waiters : List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def _acquire(self, priority : Priority):
+        if self._active < self.concurrency and not self._waiters:
+            self._active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # the slot may have been handed over right before the cancellation, pass it on
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self):
+        self._active -= 1
+        while self._waiters and self._active < self.concurrency:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._active += 1
+                future.set_result(None)
+
+    # the slot is held until func returns, even when cancelled, so func has to stop its request before it returns
+    async def _fetch_one(self, func : Callable[[T], Awaitable[R]], item : T, priority : Priority) -> R:
+        await self._acquire(priority)
+        try:
+            return await func(item)
+        finally:
+            self._release()
+
+    # returns [await func(item) for item in items], fetched concurrently
+    # if one of them fails (or the caller is cancelled) the ones that haven't finished are cancelled
+    async def fetch(self, items : Iterable[T], func : Callable[[T], Awaitable[R]]) -> List[R]:
+        priority = current_priority.get()
+        tasks = [asyncio.ensure_future(self._fetch_one(func, item, priority)) for item in items]
+        if not tasks:
+            return []
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
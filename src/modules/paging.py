@@ -0,0 +1,133 @@
+# paging.py
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Mapping, Optional, Tuple
+
+Rows = List[Dict[str, Any]]
+# fetches one api page, returns (rows, Pagination-Count) where the count is None if the page was empty
+FetchPage = Callable[[int], Awaitable[Tuple[Rows, Optional[int]]]]
+
+# what is known about the size of a paginated endpoint
+class PageInfo:
+
+    def __init__(self, page_count : int, last_page_length : int):
+        self.page_count = page_count
+        self.last_page_length = last_page_length
+
+    def total(self, page_size : int) -> int:
+        if self.page_count == 0:
+            return 0
+        return (self.page_count - 1) * page_size + self.last_page_length
+
+# returns the api pages (1 indexed) that hold rows [offset, offset + limit)
+def pages_for_window(offset : int, limit : int, page_size : int) -> range:
+    return range(offset // page_size + 1, (offset + limit - 1) // page_size + 2)
+
+# reads rows [offset, offset + limit) of an endpoint that returns page_size rows per page with as few requests as possible
+# if offset is past the end, the last window that has rows is returned instead (like going to the last page)
+# pad: how many extra pages to read on each side of the window, sort: applied to the rows of every page that was read
+# before the window is cut out, for endpoints whose pages aren't sorted correctly across page boundaries
+# info: what is already known about the endpoint, when it's given the page count isn't looked up
+# returns (rows, total rows, info)
+async def read_window(fetch_page : FetchPage, offset : int, limit : int, page_size : int, info : Optional[PageInfo] = None,
+        pad : int = 0, sort : Callable[[Rows], Rows] = None) -> Tuple[Rows, int, PageInfo]:
+    fetched : Dict[int, Tuple[Rows, Optional[int]]] = {}
+
+    async def fetch(pages):
+        pages = [page for page in pages if page not in fetched]
+        results = await asyncio.gather(*(fetch_page(page) for page in pages))
+        fetched.update(zip(pages, results))
+
+    def window_pages(offset, page_count):
+        window = pages_for_window(offset, limit, page_size)
+        return range(max(1, window.start - pad), min(page_count, window.stop - 1 + pad) + 1)
+
+    def consistent(info):
+        # a page that came back with a different page count (or empty when it shouldn't be) means the info is stale
+        for page, (rows, page_count) in fetched.items():
+            if page <= info.page_count:
+                if page_count != info.page_count or len(rows) != (page_size if page < info.page_count else info.last_page_length):
+                    return False
+            elif rows:
+                return False
+        return True
+
+    if info is not None:
+        total = info.total(page_size)
+        if total > 0:
+            # only clamped for this guess, if the info turns out to be stale the caller's offset is used again
+            await fetch(window_pages(min(offset, (total - 1) // limit * limit), info.page_count))
+            if not consistent(info):
+                info = None
+    if info is None:
+        await fetch(pages_for_window(offset, limit, page_size))
+        page_count = next((count for _, count in fetched.values() if count is not None), None)
+        if page_count is None:
+            # the window is past the end, the first page has the page count
+            await fetch([1])
+            page_count = fetched[1][1]
+        if page_count is None:
+            info = PageInfo(0, 0)
+        else:
+            await fetch([page_count])
+            info = PageInfo(page_count, len(fetched[page_count][0]))
+    total = info.total(page_size)
+    if total == 0:
+        return [], 0, info
+    offset = min(offset, (total - 1) // limit * limit)
+    pages = window_pages(offset, info.page_count)
+    await fetch(pages)
+
+    rows = []
+    for page in pages:
+        rows += fetched[page][0]
+    if sort is not None:
+        rows = sort(rows)
+    start = offset - (pages.start - 1) * page_size
+    return rows[start:start+limit], total, info
+
+# the number of pages of page_length rows that total rows make up
+def count_pages(total : int, page_length : int) -> int:
+    return (total + page_length - 1) // page_length
+
+# remembers the page count and last page length of paginated endpoints, keyed by (url, params without the page)
+# it's updated from every response, the page count comes from any page but the last page length is only known
+# once the last page has been seen, entries older than ttl seconds are ignored
+class PaginationCache:
+
+    def __init__(self, ttl : float = 10*60, max_entries : int = 4096):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (time, page count, last page length)
+        self._entries : "OrderedDict[Hashable, Tuple[float, int, Optional[int]]]" = OrderedDict()
+        self.hits : int = 0
+        self.misses : int = 0
+
+    @staticmethod
+    def _key(url : str, params : Mapping[str, Any]) -> Hashable:
+        return url, tuple(sorted((k, str(v)) for k, v in params.items() if k != "page"))
+
+    def update(self, url : str, params : Mapping[str, Any], rows : Rows, page_count : Optional[int]):
+        page = params.get("page")
+        if page is None or page_count is None:
+            return
+        key = self._key(url, params)
+        old = self._entries.get(key)
+        last_page_length = None
+        if int(page) == page_count:
+            last_page_length = len(rows)
+        elif old is not None and old[1] == page_count:
+            last_page_length = old[2]
+        self._entries[key] = (time.monotonic(), page_count, last_page_length)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, url : str, params : Mapping[str, Any]) -> Optional[PageInfo]:
+        entry = self._entries.get(self._key(url, params))
+        if entry is None or entry[2] is None or time.monotonic() - entry[0] > self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return PageInfo(entry[1], entry[2])
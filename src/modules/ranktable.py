@@ -0,0 +1,57 @@
+# ranktable.py
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy
+
+from modules.strafes_base import User
+
+# a snapshot of the full rank list of one game/style, stored as arrays sorted by placement
+# rows are handed out as dicts shaped like the api's so Rank.from_dict works on them
+# user_data: the users of the rows resolved while the table was built, so pages don't need a roblox lookup
+class RankTable:
+
+    def __init__(self, rows : List[Dict[str, Any]], taken_at : float = None, user_data : Dict[int, User] = None):
+        # pages fetched while the ranks were moving can repeat users, keep the best placement of each
+        rows = sorted(rows, key=lambda i: i["Placement"])
+        seen = set()
+        unique = []
+        for row in rows:
+            if row["User"] not in seen:
+                seen.add(row["User"])
+                unique.append(row)
+        count = len(unique)
+        self.users = numpy.fromiter((row["User"] for row in unique), dtype=numpy.int64, count=count)
+        self.ranks = numpy.fromiter((float(row["Rank"]) for row in unique), dtype=numpy.float64, count=count)
+        self.skills = numpy.fromiter((float(row["Skill"]) for row in unique), dtype=numpy.float64, count=count)
+        self.placements = numpy.fromiter((row["Placement"] for row in unique), dtype=numpy.int64, count=count)
+        self._by_user = numpy.argsort(self.users, kind="stable")
+        self._sorted_users = self.users[self._by_user]
+        self.taken_at : float = time.time() if taken_at is None else taken_at
+        self.user_data : Dict[int, User] = user_data if user_data is not None else {}
+
+    def __len__(self):
+        return len(self.users)
+
+    # seconds since the snapshot was taken
+    @property
+    def age(self) -> float:
+        return time.time() - self.taken_at
+
+    def _row(self, i : int) -> Dict[str, Any]:
+        return {
+            "User":int(self.users[i]),
+            "Rank":float(self.ranks[i]),
+            "Skill":float(self.skills[i]),
+            "Placement":int(self.placements[i])
+        }
+
+    # returns rows [offset, offset + limit) by placement
+    def rows(self, offset : int, limit : int) -> List[Dict[str, Any]]:
+        return [self._row(i) for i in range(max(0, offset), min(len(self), offset + limit))]
+
+    def find(self, user_id : int) -> Optional[Dict[str, Any]]:
+        i = numpy.searchsorted(self._sorted_users, user_id)
+        if i < len(self._sorted_users) and self._sorted_users[i] == user_id:
+            return self._row(int(self._by_user[i]))
+        return None
@@ -0,0 +1,82 @@
+# ratelimit.py
+import asyncio
+import time
+from typing import Mapping, Optional, Tuple
+
+# client side token bucket that mirrors the strafes.net rate limit window
+# every request takes a token before it is sent, when the bucket is empty requests wait
+# (in the order they arrived) until the window resets instead of going out and getting a 429
+# the bucket is corrected from the RateLimit-* headers of every response
+class RateLimiter:
+
+    def __init__(self, limit : int = 100, window : float = 60.0):
+        self.limit : int = limit
+        self.window : float = window
+        self._remaining : int = limit
+        self._reset_at : Optional[float] = None
+        self._in_flight : int = 0
+        self._waiting : int = 0
+        self._queue_lock = asyncio.Lock()
+        self._changed = asyncio.Event()
+
+    def _refill(self, now : float):
+        if self._reset_at is None or now >= self._reset_at:
+            self._remaining = self.limit
+            self._reset_at = now + self.window
+
+    async def acquire(self):
+        self._waiting += 1
+        try:
+            # only the request at the front of the queue holds the lock, so tokens are handed out FIFO
+            async with self._queue_lock:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._remaining > 0:
+                        self._remaining -= 1
+                        self._in_flight += 1
+                        return
+                    # sleep until the window resets, or until a response tells us it reset early
+                    self._changed.clear()
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), self._reset_at - now)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            self._waiting -= 1
+
+    # call exactly once for every acquire() whatever happened to the request, headers is None if no response was
+    # received (ex. timeouts, connection errors, cancellation)
+    def update(self, headers : Optional[Mapping[str, str]], status : int = 200):
+        self._in_flight = max(0, self._in_flight - 1)
+        if headers is None:
+            return
+        now = time.monotonic()
+        try:
+            limit = headers.get("RateLimit-Limit")
+            if limit is not None:
+                self.limit = int(limit)
+            reset = headers.get("RateLimit-Reset")
+            if reset is not None:
+                self._reset_at = now + float(reset)
+            remaining = headers.get("RateLimit-Remaining")
+            if remaining is not None:
+                # the server hasn't counted the requests that are still in flight yet
+                self._remaining = max(0, int(remaining) - self._in_flight)
+        except ValueError:
+            pass
+        if status == 429:
+            self._remaining = 0
+            if self._reset_at is None or self._reset_at <= now:
+                self._reset_at = now + self.window
+        self._changed.set()
+
+    # returns (requests remaining in the current window, seconds until the window resets)
+    def info(self) -> Tuple[int, int]:
+        now = time.monotonic()
+        self._refill(now)
+        return self._remaining, max(0, int(self._reset_at - now))
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
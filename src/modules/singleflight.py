@@ -0,0 +1,66 @@
+# singleflight.py
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from modules import tracing
+
+# coalesces concurrent identical calls into one
+# the first caller for a key starts the call, anyone asking for the same key while it is still
+# running awaits the same result (or exception), so results are shared and must not be mutated
+# a call is cancelled once every caller waiting on it has been cancelled
+class SingleFlight:
+
+    def __init__(self):
+        self._in_flight : Dict[Hashable, asyncio.Future] = {}
+        # call -> callers still waiting on it
+        self._waiters : Dict[asyncio.Future, int] = {}
+        self.calls : int = 0
+        self.saved : int = 0
+
+    @staticmethod
+    def make_key(method : str, url : str, params : Dict[str, Any]) -> Hashable:
+        return (method, url, json.dumps(params, sort_keys=True, default=str))
+
+    def _done(self, key : Hashable, task : asyncio.Future):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # mark the exception as retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def _wait(self, key : Hashable, task : asyncio.Future) -> Any:
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # shielded so one caller being cancelled doesn't cancel the call for everyone else
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1 and not task.done():
+                # nobody else wants the result, so stop the call (ex. a request still waiting on the rate limiter)
+                # and wait for it to stop so callers limiting concurrency don't start another one in the meantime
+                if self._in_flight.get(key) is task:
+                    del self._in_flight[key]
+                task.cancel()
+                await asyncio.wait([task])
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if self._waiters[task] == 0:
+                del self._waiters[task]
+
+    async def do(self, key : Hashable, func : Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+        if task is None:
+            self.calls += 1
+            # the call is shared, so it isn't traced as part of the caller that happened to start it
+            task = asyncio.ensure_future(tracing.detached(func()))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+            return await self._wait(key, task)
+        self.saved += 1
+        with tracing.span("joined flight"):
+            return await self._wait(key, task)
+
+    # returns (calls made, calls saved)
+    def info(self) -> Tuple[int, int]:
+        return self.calls, self.saved
@@ -1,15 +1,56 @@
 # strafes.py
 from aiocache import cached
+from aiocache.plugins import HitMissRatioPlugin
 import aiohttp
-from aiorwlock import RWLock
 import asyncio
-import json
+from collections import deque
 import random
+import sys
 import time
-from typing import Any, Dict, List, Optional, Tuple, Union
-
+import traceback
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from modules import metrics, tracing
+from modules.catalog import MapCatalog, MapChanges
+from modules.leaderboard import Leaderboard, LeaderboardCache, TopTimesCache, sort_map_rows
+from modules.metrics import Sample, endpoint_label
+from modules.pagefetch import PageFetcher
+from modules.paging import PageInfo, PaginationCache, count_pages, read_window
+from modules.ranktable import RankTable
+from modules.ratelimit import RateLimiter
+from modules.singleflight import SingleFlight
 from modules.strafes_base import *
-from modules.utils import Incrementer, fix_path, open_json
+from modules.users import UserResolver
+from modules.usertimes import UserTimes, UserTimesCache
+from modules.utils import open_json, write_json_atomic
+from modules.wrfeed import WRFeed
+
+# bump this whenever the snapshot format or the Map fields change so old snapshots get ignored
+MAP_SNAPSHOT_VERSION = 1
+MAP_SNAPSHOT_PATH = "files/maps_snapshot.json"
+WR_FEED_PATH = "files/wr_feed.db"
+
+# base urls of the apis, they can be pointed somewhere else (ex. the mock server in benchmarks) through the client's constructor
+STRAFES_URL = "https://api.strafes.net/v1/"
+ROBLOX_USERS_URL = "https://users.roblox.com/v1/"
+ROBLOX_THUMBNAILS_URL = "https://thumbnails.roblox.com/v1/"
+VERIFY_URL = "https://verify.eryn.io/api/"
+
+_REQUESTS = metrics.registry.counter("strafes_upstream_requests_total", "Requests made to upstream APIs by status (or timeout/error).")
+_REQUEST_SECONDS = metrics.registry.histogram("strafes_upstream_request_seconds", "Upstream request latency.")
+_RATELIMITED = metrics.registry.counter("strafes_upstream_ratelimited_total", "Upstream requests that got a 429.")
+_TIMEOUTS = metrics.registry.counter("strafes_upstream_timeouts_total", "Upstream requests that timed out.")
+_COLLECTED_HELP = {
+    "strafes_ratelimit_remaining":"Requests left in the current strafes.net rate limit window.",
+    "strafes_ratelimit_reset_seconds":"Seconds until the strafes.net rate limit window resets.",
+    "strafes_ratelimit_waiting":"Requests waiting for the strafes.net rate limit.",
+    "strafes_requests_coalesced":"Requests that shared an identical in-flight request.",
+    "strafes_cache_hits":"Cache hits by cache.",
+    "strafes_cache_misses":"Cache misses by cache.",
+    "strafes_cache_hit_ratio":"Cache hit ratio by cache.",
+    "strafes_map_catalog_version":"Version of the published map catalog.",
+    "strafes_rank_table_age_seconds":"Age of the rank table snapshot by game and style."
+}
 
 class APIError(Exception):
 
@@ -58,27 +99,92 @@ class JSONRes:
         self.json = json
 
 class StrafesClient:
-    def __init__(self, api_key):
+
+    RATELIMIT_RETRIES = 3
+    # rank tables older than this many seconds aren't used
+    RANK_TABLE_MAX_AGE = 3*60*60
+    # how many requests of every rate limit window are left for commands while the rank tables are updated
+    RANK_CRAWL_RESERVE = 40
+    # at most this many rank pages are crawled per hour, the rest of the crawl waits for the next hour
+    RANK_CRAWL_PAGES_PER_HOUR = 1200
+
+    # page_concurrency: how many pages of a paginated endpoint can be fetched at once, across every caller
+    def __init__(self, api_key, page_concurrency : int = 8, strafes_url : str = STRAFES_URL, users_url : str = ROBLOX_USERS_URL,
+            thumbnails_url : str = ROBLOX_THUMBNAILS_URL, verify_url : str = VERIFY_URL):
         self._api_key = api_key
+        self._strafes_url = strafes_url
+        self._users_url = users_url
+        self._thumbnails_url = thumbnails_url
+        self._verify_url = verify_url
         self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20))
-        self._bhop_map_pairs : List[Tuple[str, Map]] = []
-        self._surf_map_pairs : List[Tuple[str, Map]] = []
-        self._bhop_map_count : int = 0
-        self._surf_map_count : int = 0
-        self._map_lookup : Dict[int, Map] = {}
-        self._maps_loaded : bool = False
-        self._map_lock = RWLock()
-        self._ratelimit_lock = asyncio.Lock()
-        self._ratelimit_remaining : int = 100
-        self._ratelimit_reset : int = 60
-        self._last_strafes_response : float = None
+        self._catalog : Optional[MapCatalog] = None
+        self._ratelimit = RateLimiter(100, 60)
+        self._flights = SingleFlight()
+        self._user_times = UserTimesCache()
+        self._leaderboards = LeaderboardCache()
+        self._top_times = TopTimesCache(ttl=self._leaderboards.top_ttl)
+        self._users = UserResolver(self._fetch_users)
+        self._wr_feed = WRFeed(WR_FEED_PATH)
+        self._pages = PageFetcher(page_concurrency)
+        self._pagination = PaginationCache()
+        self._rank_tables : Dict[Tuple[Game, Style], RankTable] = {}
+        # when each rank page crawled in the last hour was fetched
+        self._crawled_pages : Deque[float] = deque()
+        metrics.registry.add_collector(self._collect_metrics, _COLLECTED_HELP)
 
     async def close(self):
+        metrics.registry.remove_collector(self._collect_metrics)
         await self._session.close()
+        await self._wr_feed.close()
 
+    @staticmethod
+    def _record_request(api_name : str, url : str, status, seconds : float):
+        endpoint = endpoint_label(url)
+        _REQUESTS.inc(api=api_name, endpoint=endpoint, status=status)
+        _REQUEST_SECONDS.observe(seconds, api=api_name, endpoint=endpoint)
+        if status == 429:
+            _RATELIMITED.inc(api=api_name)
+        elif status == "timeout":
+            _TIMEOUTS.inc(api=api_name)
+
+    # values read on every scrape of the metrics endpoint
+    def _collect_metrics(self) -> Iterable[Sample]:
+        remaining, reset = self._ratelimit.info()
+        yield "strafes_ratelimit_remaining", {}, remaining
+        yield "strafes_ratelimit_reset_seconds", {}, reset
+        yield "strafes_ratelimit_waiting", {}, self._ratelimit.waiting
+        _, saved = self._flights.info()
+        yield "strafes_requests_coalesced", {}, saved
+        caches = [
+            ("user_resolver", self._users.hits, self._users.misses),
+            ("user_times", self._user_times.hits, self._user_times.misses),
+            ("pagination", self._pagination.hits, self._pagination.misses),
+            ("top_times", self._top_times.hits, self._top_times.misses)
+        ]
+        for func in (StrafesClient._get_user_data_from_name, StrafesClient.get_roblox_user_from_discord, StrafesClient.get_user_headshot_url, StrafesClient.get_asset_thumbnail):
+            ratio = getattr(func.cache, "hit_miss_ratio", {"hits":0, "total":0})
+            caches.append((func.__name__.lstrip("_"), ratio["hits"], ratio["total"] - ratio["hits"]))
+        for name, hits, misses in caches:
+            yield "strafes_cache_hits", {"cache":name}, hits
+            yield "strafes_cache_misses", {"cache":name}, misses
+            yield "strafes_cache_hit_ratio", {"cache":name}, hits / (hits + misses) if hits + misses > 0 else 0
+        if self._catalog is not None:
+            yield "strafes_map_catalog_version", {}, self._catalog.version
+        for (game, style), table in self._rank_tables.items():
+            yield "strafes_rank_table_age_seconds", {"game":str(game), "style":str(style)}, table.age
+
+    # identical requests that are already in flight share the same response
     async def get_request(self, url : str, api_name : str, params={}, headers={}) -> JSONRes:
+        params = dict(params)
+        with tracing.span(f"{api_name} GET {endpoint_label(url)}"):
+            return await self._flights.do(SingleFlight.make_key("GET", url, params), lambda: self._get_request(url, api_name, params, headers))
+
+    async def _get_request(self, url : str, api_name : str, params={}, headers={}) -> JSONRes:
+        start = time.monotonic()
+        status = "error"
         try:
             async with self._session.get(url, headers=headers, params=params) as res:
+                status = res.status
                 err = None
                 if res.status == 404:
                     raise NotFoundError(res)
@@ -98,11 +204,22 @@ class StrafesClient:
                 except aiohttp.ContentTypeError:
                     raise APIError(url, headers, params, res.status, await res.text(), api_name)
         except asyncio.TimeoutError:
+            status = "timeout"
             raise TimeoutError(self._session.timeout.total, url, headers, params, api_name)
+        finally:
+            self._record_request(api_name, url, status, time.monotonic() - start)
 
     async def post_request(self, url, api_name, data={}, headers={}) -> JSONRes:
+        data = dict(data)
+        with tracing.span(f"{api_name} POST {endpoint_label(url)}"):
+            return await self._flights.do(SingleFlight.make_key("POST", url, data), lambda: self._post_request(url, api_name, data, headers))
+
+    async def _post_request(self, url, api_name, data={}, headers={}) -> JSONRes:
+        start = time.monotonic()
+        status = "error"
         try:
             async with self._session.post(url, headers=headers, data=data) as res:
+                status = res.status
                 err = None
                 if res.status == 404:
                     raise NotFoundError()
@@ -122,11 +239,21 @@ class StrafesClient:
                 except aiohttp.ContentTypeError:
                     raise APIError(url, headers, data, res.status, await res.text(), api_name)
         except asyncio.TimeoutError:
+            status = "timeout"
             raise TimeoutError(self._session.timeout.total, url, headers, data, api_name)
+        finally:
+            self._record_request(api_name, url, status, time.monotonic() - start)
 
     async def get_bytes(self, url):
+        with tracing.span(f"download {endpoint_label(url)}"):
+            return await self._flights.do(SingleFlight.make_key("BYTES", url, {}), lambda: self._get_bytes(url))
+
+    async def _get_bytes(self, url):
+        start = time.monotonic()
+        status = "error"
         try:
             async with self._session.get(url) as res:
+                status = res.status
                 if res.status == 404:
                     raise NotFoundError()
                 elif res.status < 200 or res.status >= 300:
@@ -137,53 +264,64 @@ class StrafesClient:
                     raise APIError(url, {}, {}, res.status, body, None, f"Error occurred attempting to download {url}")
                 return await res.read()
         except asyncio.TimeoutError:
+            status = "timeout"
             raise TimeoutError(self._session.timeout.total, url, {}, {}, None, f"Timeout occurred attempting to download {url}")
+        finally:
+            # image urls are unique (cdn hashes), so only the host is used as the endpoint to keep the label set small
+            self._record_request("download", url.split("://", 1)[-1].split("/", 1)[0], status, time.monotonic() - start)
 
-    async def update_ratelimit_info(self, res : aiohttp.ClientResponse):
-        reset = int(res.headers["RateLimit-Reset"])
-        now = time.monotonic()
-        async with self._ratelimit_lock:
-            if self._last_strafes_response is None or now - self._last_strafes_response > self._ratelimit_reset:
-                self._ratelimit_remaining = 99
-            else:
-                self._ratelimit_remaining = max(0, self._ratelimit_remaining - 1)
-            self._ratelimit_reset = reset
-            self._last_strafes_response = now
+    async def update_ratelimit_info(self, res : Optional[aiohttp.ClientResponse]):
+        if res is None:
+            self._ratelimit.update(None)
+        else:
+            self._ratelimit.update(res.headers, res.status)
 
     async def _get_strafes(self, end_of_url, params={}) -> JSONRes:
+        with tracing.span("strafes.net rate limit wait"):
+            await self._ratelimit.acquire()
+        # the slot taken by acquire() has to be given back on every way out, including connection errors and
+        # cancellation, or the limiter keeps counting it as in flight forever
+        res = None
         try:
-            data = await self.get_request(f"https://api.strafes.net/v1/{end_of_url}", "strafes.net", params, {"api-key":self._api_key})
-            await self.update_ratelimit_info(data.res)
-        except TimeoutError:
-            raise
-        except APIError as err:
-            await self.update_ratelimit_info(err.res)
-            raise
-        except NotFoundError as err:
-            await self.update_ratelimit_info(err.res)
+            data = await self._get_request(f"{self._strafes_url}{end_of_url}", "strafes.net", params, {"api-key":self._api_key})
+            res = data.res
+        except (APIError, NotFoundError) as err:
+            res = err.res
             raise
+        finally:
+            await self.update_ratelimit_info(res)
+        page_count = data.res.headers.get("Pagination-Count")
+        if page_count is not None and isinstance(data.json, list):
+            try:
+                self._pagination.update(end_of_url, params, data.json, int(page_count))
+            except ValueError:
+                pass
         return data
 
+    # a 429 means our view of the window was off, the limiter has been corrected by the response
+    # so the retry waits for the window to reset rather than failing the command
     async def get_strafes(self, end_of_url, params={}) -> JSONRes:
-        try:
-            data = await self._get_strafes(end_of_url, params)
-        except RateLimitError as err:
-            async with self._ratelimit_lock:
-                reset = self._ratelimit_reset
-            raise RateLimitError(err.url, err.headers, err.params, err.status, err.body, "strafes.net", f"Rate limit exceeded using the strafes.net API, please wait {reset} seconds.")
-        return data
+        params = dict(params)
+        with tracing.span(f"strafes.net GET {endpoint_label(end_of_url)}", page=params.get("page", "")):
+            return await self._flights.do(SingleFlight.make_key("GET", end_of_url, params), lambda: self._get_strafes_retry(end_of_url, params))
+
+    async def _get_strafes_retry(self, end_of_url, params={}) -> JSONRes:
+        attempts = 0
+        while True:
+            try:
+                return await self._get_strafes(end_of_url, params)
+            except RateLimitError as err:
+                attempts += 1
+                if attempts > self.RATELIMIT_RETRIES:
+                    _, reset = self._ratelimit.info()
+                    raise RateLimitError(err.url, err.headers, err.params, err.status, err.body, "strafes.net", f"Rate limit exceeded using the strafes.net API, please wait {reset} seconds.")
 
     async def get_ratelimit_info(self) -> Tuple[int, int]:
-        now = time.monotonic()
-        async with self._ratelimit_lock:
-            if self._last_strafes_response is None:
-                return self._ratelimit_remaining, self._ratelimit_reset
-            diff = now - self._last_strafes_response
-            if diff > self._ratelimit_reset:
-                self._ratelimit_remaining = 100
-                self._ratelimit_reset = 60
-                self._last_strafes_response = now
-            return self._ratelimit_remaining, self._ratelimit_reset - int(diff)
+        return self._ratelimit.info()
+
+    # returns (requests made, requests saved by sharing an identical in-flight request)
+    def get_coalesce_info(self) -> Tuple[int, int]:
+        return self._flights.info()
 
     async def _map_mapper(self, game : Game, page : int):
         res = self.get_strafes("map", {
@@ -192,7 +330,7 @@ class StrafesClient:
         })
         return game, await res
 
-    async def load_maps(self):
+    async def _fetch_maps(self) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
         first_bhop = self.get_strafes("map", {
             "game":Game.BHOP.value,
             "page":1
@@ -203,162 +341,133 @@ class StrafesClient:
         })
         tasks = [first_bhop, first_surf]
         data : List[JSONRes] = await asyncio.gather(*tasks)
-        bhop_maps = data[0].json
-        surf_maps = data[1].json
+        bhop_maps = list(data[0].json)
+        surf_maps = list(data[1].json)
         bhop_pages = int(data[0].res.headers["Pagination-Count"])
         surf_pages = int(data[1].res.headers["Pagination-Count"])
 
-        tasks = []
-        page = Incrementer(1)
-        while page.increment() < bhop_pages:
-            tasks.append(self._map_mapper(Game.BHOP, page.get()))
-        page = Incrementer(1)
-        while page.increment() < surf_pages:
-            tasks.append(self._map_mapper(Game.SURF, page.get()))
-        responses : List[Tuple[Game, JSONRes]] = await asyncio.gather(*tasks)
+        pages = [(Game.BHOP, page) for page in range(2, bhop_pages + 1)] + [(Game.SURF, page) for page in range(2, surf_pages + 1)]
+        responses : List[Tuple[Game, JSONRes]] = await self._pages.fetch(pages, lambda i: self._map_mapper(*i))
         for game, res in responses:
             if game == Game.BHOP:
                 bhop_maps += res.json
             elif game == Game.SURF:
                 surf_maps += res.json
-        
-        async with self._map_lock.writer_lock:
-            self._bhop_map_count = len(bhop_maps)
-            self._surf_map_count = len(surf_maps)
-
-            self._bhop_map_pairs.clear()
-            self._surf_map_pairs.clear()
-            self._map_lookup.clear()
-
-            for m in bhop_maps:
-                map = Map.from_dict(m)
-                self._bhop_map_pairs.append((map.displayname.lower(), map))
-                self._map_lookup[map.id] = map
-            self._bhop_map_pairs.sort(key=lambda i: i[0])
-
-            for m in surf_maps:
-                map = Map.from_dict(m)
-                self._surf_map_pairs.append((map.displayname.lower(), map))
-                self._map_lookup[map.id] = map
-            self._surf_map_pairs.sort(key=lambda i: i[0])
-            self._maps_loaded = True
-
-    # ls should be sorted
-    # performs an iterative binary search
-    # returns the first index where the item was found according to the compare function
-    @staticmethod
-    def _find_item(ls, compare) -> int:
-        left = 0
-        right = len(ls) - 1
-        while left <= right:
-            middle = (left + right) // 2
-            res = compare(ls[middle])
-            if res == 0:
-                return middle
-            elif res < 0:
-                left = middle + 1
-            else:
-                right = middle - 1
-        return -1
+        return bhop_maps, surf_maps
 
-    @staticmethod
-    def _compare_maps(name : str, map_name : str) -> int:
-        if map_name.startswith(name):
-            return 0
-        elif map_name < name:
-            return -1
-        else:
-            return 1
+    # the catalog is built off the event loop and published with a single reference swap
+    async def _set_maps(self, bhop_maps : List[Dict[str, Any]], surf_maps : List[Dict[str, Any]]):
+        version = 1 if self._catalog is None else self._catalog.version + 1
+        self._catalog = await asyncio.to_thread(MapCatalog.build, bhop_maps + surf_maps, version)
 
-    @staticmethod
-    def _map_from_name(name : str, ls : List[Tuple[str, Map]]) -> Optional[Map]:
-        name = name.lower()
-        idx = StrafesClient._find_item(ls, lambda m : StrafesClient._compare_maps(name, m[0]))
-        if idx != -1:
-            while idx > 0:
-                if ls[idx-1][0].startswith(name):
-                    idx -= 1
-                else:
-                    break
-            return ls[idx][1]
-        else:
-            the_map = None
-            shortest_name = None
-            for map_name, m in ls:
-                if name in map_name and (shortest_name is None or len(map_name) < len(shortest_name)):
-                    shortest_name = map_name
-                    the_map = m
-            return the_map
+    async def load_maps(self):
+        bhop_maps, surf_maps = await self._fetch_maps()
+        await self._set_maps(bhop_maps, surf_maps)
+        await self.write_map_snapshot(bhop_maps, surf_maps)
+
+    # refetches the map list but only applies the maps that were added, removed or changed since the last load
+    # when nothing changed the catalog isn't touched at all
+    async def refresh_maps(self) -> MapChanges:
+        if self._catalog is None:
+            await self.load_maps()
+            return MapChanges()
+        bhop_maps, surf_maps = await self._fetch_maps()
+        catalog, changes = await asyncio.to_thread(self._catalog.update, bhop_maps + surf_maps)
+        if changes:
+            self._catalog = catalog
+            await self.write_map_snapshot(bhop_maps, surf_maps)
+        return changes
+
+    # the snapshot is the raw map list from the api so it can be loaded exactly like a fresh fetch
+    async def write_map_snapshot(self, bhop_maps : List[Dict[str, Any]], surf_maps : List[Dict[str, Any]]):
+        snapshot = {
+            "version":MAP_SNAPSHOT_VERSION,
+            "created":int(time.time()),
+            "maps":{
+                str(Game.BHOP.value):bhop_maps,
+                str(Game.SURF.value):surf_maps
+            }
+        }
+        try:
+            await asyncio.to_thread(write_json_atomic, MAP_SNAPSHOT_PATH, snapshot)
+        except OSError:
+            pass
+
+    # returns True if maps were loaded from the snapshot on disk, maps should still be refreshed with load_maps() afterwards
+    async def load_map_snapshot(self) -> bool:
+        try:
+            snapshot = await asyncio.to_thread(open_json, MAP_SNAPSHOT_PATH)
+            if snapshot["version"] != MAP_SNAPSHOT_VERSION:
+                return False
+            bhop_maps = snapshot["maps"][str(Game.BHOP.value)]
+            surf_maps = snapshot["maps"][str(Game.SURF.value)]
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        await self._set_maps(bhop_maps, surf_maps)
+        return True
+
+    # returns the current catalog, callers should use the same catalog for the whole operation
+    def get_catalog(self) -> MapCatalog:
+        catalog = self._catalog
+        if catalog is None:
+            raise MapsNotLoadedError()
+        return catalog
 
     async def map_from_name(self, map_name : str, game : Optional[Game]) -> Optional[Map]:
-        async with self._map_lock.reader_lock:
-            if not self._maps_loaded:
-                raise MapsNotLoadedError()
-            if game == Game.BHOP:
-                return self._map_from_name(map_name, self._bhop_map_pairs)
-            elif game == Game.SURF:
-                return self._map_from_name(map_name, self._surf_map_pairs)
-            elif game is None:
-                res = self._map_from_name(map_name, self._bhop_map_pairs)
-                if res is None:
-                    res = self._map_from_name(map_name, self._surf_map_pairs)
-                return res
-            return None
+        return self.get_catalog().map_from_name(map_name, game)
 
     async def map_from_id(self, map_id:int) -> Map:
-        async with self._map_lock.reader_lock:
-            if not self._maps_loaded:
-                raise MapsNotLoadedError()
-            try:
-                return self._map_lookup[map_id]
-            except KeyError:
-                return Map(-1, "Missing map", "", Game.BHOP, -1, -1)
+        return self._map_from_id(self.get_catalog(), map_id)
+
+    @staticmethod
+    def _map_from_id(catalog : MapCatalog, map_id : int) -> Map:
+        map = catalog.map_from_id(map_id)
+        if map is None:
+            return Map(-1, "Missing map", "", Game.BHOP, -1, -1)
+        return map
 
     async def get_map_count(self, game : Game) -> int:
-        async with self._map_lock.reader_lock:
-            if not self._maps_loaded:
-                raise MapsNotLoadedError()
-            if game == Game.BHOP:
-                return self._bhop_map_count
-            elif game == Game.SURF:
-                return self._surf_map_count
-            else:
-                return 1
-
-    async def get_maps_by_creator(self, creator : Optional[str]) -> List[Map]:
-        async with self._map_lock.reader_lock:
-            if not self._maps_loaded:
-                raise MapsNotLoadedError()
-            if not creator:
-                return list(self._map_lookup.values())
-            creator = creator.lower()
-            matches = []
-            for map in self._map_lookup.values():
-                if creator in map.creator.lower():
-                    matches.append(map)
-            return matches
+        return self.get_catalog().map_count(game)
+
+    # returns the maps sorted by (game, name), the result must not be modified
+    async def get_maps_by_creator(self, creator : Optional[str]) -> Sequence[Map]:
+        return self.get_catalog().maps_by_creator(creator)
+
+    # returns the maps of a game sorted by name, the result must not be modified
+    async def get_maps(self, game : Game) -> Sequence[Map]:
+        return self.get_catalog().maps(game)
 
     async def get_all_maps(self) -> List[Map]:
-         async with self._map_lock.reader_lock:
-            if not self._maps_loaded:
-                raise MapsNotLoadedError()
-            return list(self._map_lookup.values())
+        return list(self.get_catalog().all_maps())
 
-    @cached(ttl=60*60)
+    # ids are resolved in batches by self._users, see UserResolver
     async def get_user_data(self, user : Union[str, int]) -> User:
         if type(user) == int:
-            res = await self.get_request(f"https://users.roblox.com/v1/users/{user}", "Roblox Users")
-            return User.from_dict(res.json)
-        else:
-            res = await self.post_request("https://users.roblox.com/v1/usernames/users", "Roblox Users", {"usernames":[user]})
-            data = res.json["data"]
-            if len(data) > 0:
-                return User.from_dict(data[0])
-            else:
+            res = await self._users.get(user)
+            if res is None:
                 raise NotFoundError()
+            return res
+        else:
+            res = await self._get_user_data_from_name(user)
+            self._users.put(res)
+            return res
+
+    @cached(ttl=60*60, plugins=[HitMissRatioPlugin()])
+    async def _get_user_data_from_name(self, username : str) -> User:
+        res = await self.post_request(f"{self._users_url}usernames/users", "Roblox Users", {"usernames":[username]})
+        data = res.json["data"]
+        if len(data) > 0:
+            return User.from_dict(data[0])
+        else:
+            raise NotFoundError()
 
+    # users that don't exist are left out
     async def get_user_data_from_list(self, users : List[int]) -> Dict[int, User]:
-        res = await self.post_request("https://users.roblox.com/v1/users", "Roblox Users", {"userIds":users})
+        with tracing.span("resolve users", count=len(users)):
+            return await self._users.get_many(users)
+
+    async def _fetch_users(self, user_ids : List[int]) -> Dict[int, User]:
+        res = await self.post_request(f"{self._users_url}users", "Roblox Users", {"userIds":user_ids})
         user_lookup = {}
         for user_dict in res.json["data"]:
             user = User.from_dict(user_dict)
@@ -370,23 +479,38 @@ class StrafesClient:
         if not user:
             user = await self.get_user_data(d["User"])
         if not map:
-            map = await self.map_from_id(d["Map"])
+            map = self._map_from_id(self.get_catalog(), d["Map"])
         return Record.from_dict(d, user, map)
 
     #include user or map if they are known already
     async def make_record_list(self, records : List, user : User = None, map : Map = None) -> List[Record]:
-        ls = []
         id_to_user = None
         if not user:
-            user_ids = set()
-            for record in records:
-                user_ids.add(record["User"])
-            id_to_user = await self.get_user_data_from_list(list(user_ids))
-        for record in records:
-            if not user:
-                ls.append(await self.record_from_dict(record, user=id_to_user[record["User"]], map=map))
-            else:
-                ls.append(await self.record_from_dict(record, user=user, map=map))
+            id_to_user = await self.get_user_data_from_list([record["User"] for record in records])
+        return self.records_from_dicts(records, id_to_user, user=user, map=map)
+
+    # converts every record without awaiting anything: the maps come from one catalog snapshot and the
+    # users from id_to_user (which must have every user when user isn't given)
+    def records_from_dicts(self, records : List, id_to_user : Optional[Dict[int, User]], user : User = None, map : Map = None) -> List[Record]:
+        with tracing.span("make records", count=len(records)):
+            return self._records_from_dicts(records, id_to_user, user, map)
+
+    def _records_from_dicts(self, records : List, id_to_user : Optional[Dict[int, User]], user : User = None, map : Map = None) -> List[Record]:
+        from_dict = Record.from_dict
+        if map:
+            if user:
+                return [from_dict(d, user, map) for d in records]
+            return [from_dict(d, id_to_user[d["User"]], map) for d in records]
+        lookup = self.get_catalog().map_from_id
+        missing_map = None
+        ls = []
+        for d in records:
+            m = lookup(d["Map"])
+            if m is None:
+                if missing_map is None:
+                    missing_map = self._map_from_id(self.get_catalog(), -1)
+                m = missing_map
+            ls.append(from_dict(d, user if user else id_to_user[d["User"]], m))
         return ls
 
     async def get_recent_wrs(self, game:Game, style:Style) -> List[Record]:
@@ -430,6 +554,11 @@ class StrafesClient:
             return 0
 
     async def get_user_rank(self, user_data:User, game:Game, style:Style) -> Optional[Rank]:
+        table = self._get_rank_table(game, style)
+        if table is not None:
+            row = table.find(user_data.id)
+            if row is not None:
+                return Rank.from_dict(row, user_data)
         res = await self.get_strafes(f"rank/{user_data.id}", {
             "game":game.value,
             "style":style.value
@@ -439,204 +568,316 @@ class StrafesClient:
         else:
             return None
 
-    async def find_max_pages(self, url, params, page_count, page_length, custom_page_length) -> int:
-        params["page"] = page_count
-        res = await self.get_strafes(url, params)
-        data = res.json
-        if len(data) > 0:
-            converted_page_count = int(((page_count - 1) * (page_length / custom_page_length)) + ((len(data) - 1) // custom_page_length) + 1)
-            return converted_page_count
-        else:
-            return 0
+    # returns the rank table of a game/style if there is one that isn't too old
+    def _get_rank_table(self, game : Game, style : Style) -> Optional[RankTable]:
+        table = self._rank_tables.get((game, style))
+        if table is None or table.age > self.RANK_TABLE_MAX_AGE or len(table) == 0:
+            return None
+        return table
+
+    # returns how old the rank table of a game/style is in seconds, None if ranks are fetched from the api
+    def get_rank_table_age(self, game : Game, style : Style) -> Optional[float]:
+        table = self._get_rank_table(game, style)
+        return None if table is None else table.age
+
+    # waits until more than reserve requests are left in the current rate limit window
+    async def _wait_for_headroom(self, reserve : int):
+        while True:
+            remaining, reset = self._ratelimit.info()
+            if remaining > reserve:
+                return
+            await asyncio.sleep(max(1, reset))
+
+    # waits until fewer than RANK_CRAWL_PAGES_PER_HOUR pages have been crawled in the last hour
+    async def _wait_for_crawl_budget(self):
+        while True:
+            now = time.monotonic()
+            while self._crawled_pages and now - self._crawled_pages[0] >= 60*60:
+                self._crawled_pages.popleft()
+            if len(self._crawled_pages) < self.RANK_CRAWL_PAGES_PER_HOUR:
+                self._crawled_pages.append(now)
+                return
+            await asyncio.sleep(max(1, self._crawled_pages[0] + 60*60 - now))
+
+    # fetches the whole rank list of a game/style one page at a time, only using requests that commands aren't using
+    async def _crawl_ranks(self, game : Game, style : Style) -> RankTable:
+        params = {
+            "game":game.value,
+            "style":style.value
+        }
+        rows = []
+        user_data : Dict[int, User] = {}
+        # the crawl can take a while, the table is as old as its first page
+        started = time.time()
+        page = 1
+        page_count = 1
+        while page <= page_count:
+            await self._wait_for_crawl_budget()
+            await self._wait_for_headroom(self.RANK_CRAWL_RESERVE)
+            res = await self.get_strafes("rank", {**params, "page":page})
+            if len(res.json) == 0:
+                break
+            page_count = int(res.res.headers["Pagination-Count"])
+            rows += res.json
+            # the usernames are resolved here too so pages of the table are answered without any requests
+            user_data.update(await self.get_user_data_from_list([row["User"] for row in res.json]))
+            page += 1
+        return await asyncio.to_thread(RankTable, rows, started, user_data)
+
+    # refreshes the rank table of every game/style, this takes a while so it's meant to run in the background
+    # a game/style that fails keeps its old table (until it's too old) and the others are still updated
+    # returns the errors by game/style
+    async def update_rank_tables(self) -> Dict[Tuple[Game, Style], Exception]:
+        errors : Dict[Tuple[Game, Style], Exception] = {}
+        for game in DEFAULT_GAMES:
+            for style in DEFAULT_STYLES:
+                if not (game == Game.SURF and style == Style.SCROLL):
+                    try:
+                        self._rank_tables[(game, style)] = await self._crawl_ranks(game, style)
+                    except Exception as error:
+                        print(f"Couldn't update the rank table of game: {game}, style: {style}", file=sys.stderr)
+                        traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
+                        errors[(game, style)] = error
+        return errors
+
+    async def _fetch_page(self, url : str, params : Dict[str, Any], page : int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        res = await self.get_strafes(url, {**params, "page":page})
+        if len(res.json) == 0:
+            return res.json, None
+        return res.json, int(res.res.headers["Pagination-Count"])
 
     #returns 25 ranks at a given page number, page 1: top 25, page 2: 26-50, etc.
     async def get_ranks(self, game:Game, style:Style, page:int) -> Tuple[List[Rank], int]:
         params = {
             "game":game.value,
-            "style":style.value,
-            "page":(int((page - 1) / 2)) + 1
+            "style":style.value
         }
         page_length = 25
-        res = await self.get_strafes("rank", params)
-        data = res.json
-        if len(data) > 0:
-            page_count = int(res.res.headers["Pagination-Count"])
-            converted_page_count = await self.find_max_pages("rank", params, page_count, 50, page_length)
+        table = self._get_rank_table(game, style)
+        if table is not None:
+            total = len(table)
+            offset = min((int(page) - 1) * page_length, max(0, (total - 1) // page_length * page_length))
+            data = table.rows(offset, page_length)
+            user_lookup = {i["User"]: table.user_data[i["User"]] for i in data if i["User"] in table.user_data}
         else:
-            params["page"] = 1
-            first_page_res = await self.get_strafes("rank", params)
-            if len(first_page_res.json) == 0:
-                return [], 0
-            else:
-                page_count = int(first_page_res.res.headers["Pagination-Count"])
-                params["page"] = page_count
-                tasks = [self.find_max_pages("rank", params, page_count, 50, page_length), self.get_strafes("rank", params)]
-                results = await asyncio.gather(*tasks)
-                converted_page_count = results[0]
-                the_res = results[1]
-                data = the_res.json
-                page = converted_page_count
+            data, total, _ = await read_window(lambda p: self._fetch_page("rank", params, p), (int(page) - 1) * page_length, page_length, 50,
+                self._pagination.get("rank", params))
+            user_lookup = {}
+        if total == 0:
+            return [], 0
         ls = []
-        if page % 2 == 1:
-            data = data[:25]
-        elif page % 2 == 0:
-            data = data[25:]
         users = []
         for i in data:
-            users.append(i["User"])
-        user_lookup = await self.get_user_data_from_list(users)
+            if i["User"] not in user_lookup:
+                users.append(i["User"])
+        if users:
+            user_lookup.update(await self.get_user_data_from_list(users))
         for i in data:
             ls.append(Rank.from_dict(i, user_lookup[i["User"]]))
-        return ls, converted_page_count
+        return ls, count_pages(total, page_length)
 
-    @staticmethod
-    def find_max_page(last_page, page_count, real_page_length, custom_page_length) -> int:
-        return int(((page_count - 1) * (real_page_length / custom_page_length)) + ((len(last_page) - 1) // custom_page_length) + 1)
+    async def _fetch_all_user_times(self, url : str, params : Dict[str, Any]) -> List[Dict[str, Any]]:
+        params = params.copy()
+        params["page"] = 1
+        first_page_res = await self.get_strafes(url, params)
+        first_page_data = first_page_res.json
+        if len(first_page_data) == 0:
+            return []
+        pagination_count = int(first_page_res.res.headers["Pagination-Count"])
+        responses = await self._pages.fetch(range(2, pagination_count + 1), lambda page: self.get_strafes(url, {**params, "page":page}))
+        results = list(first_page_data)
+        for response in responses:
+            results += response.json
+        return results
+
+    # times come back newest first, so after the first full fetch only the pages up to the first
+    # time we already have need to be fetched, which is usually just the first page
+    async def _sync_user_times(self, key, url : str, params : Dict[str, Any]) -> List[Dict[str, Any]]:
+        entry = self._user_times.get(key)
+        if entry is None:
+            entry = UserTimes(await self._fetch_all_user_times(url, params))
+            self._user_times.put(key, entry)
+            return entry.rows
+        params = params.copy()
+        new_rows = []
+        last_page_length = 0
+        page = 1
+        while True:
+            params["page"] = page
+            res = await self.get_strafes(url, params)
+            rows = res.json
+            if len(rows) == 0:
+                pagination_count = 0
+                break
+            pagination_count = int(res.res.headers["Pagination-Count"])
+            if page == pagination_count:
+                last_page_length = len(rows)
+            done = False
+            for row in rows:
+                if entry.has(row):
+                    done = True
+                    break
+                new_rows.append(row)
+            if done or page >= pagination_count:
+                break
+            page += 1
+        entry = entry.merge(new_rows)
+        # the exact number of times upstream needs the length of the last page, a cached length could be from before a deletion
+        if page < pagination_count:
+            params["page"] = pagination_count
+            last_page_length = len((await self.get_strafes(url, params)).json)
+        total = (pagination_count - 1) * 200 + last_page_length if pagination_count > 0 else 0
+        # if the count doesn't add up then times were removed (or the last page changed under us), so start over
+        if len(entry.rows) != total:
+            entry = UserTimes(await self._fetch_all_user_times(url, params))
+        self._user_times.put(key, entry)
+        return entry.rows
+
+    # returns every time a user has in the given game and style, the result must not be modified
+    async def get_all_user_times(self, user_data:User, game:Optional[Game], style:Optional[Style]) -> List[Dict[str, Any]]:
+        url = f"time/user/{user_data.id}"
+        params = {}
+        if game is not None:
+            params["game"] = game.value
+        if style is not None:
+            params["style"] = style.value
+        key = (user_data.id, game, style)
+        return await self._flights.do(("user_times", key), lambda: self._sync_user_times(key, url, params))
 
     async def get_user_times(self, user_data:User, game:Optional[Game], style:Optional[Style], page:int) -> Tuple[List[Record], int]:
+        if page == -1:
+            results = await self.get_all_user_times(user_data, game, style)
+            if len(results) == 0:
+                return [], 0
+            return await self.make_record_list(results, user=user_data), -1
         url = f"time/user/{user_data.id}"
-        params = {"page":1}
+        params = {}
         if game is not None:
             params["game"] = game.value
         if style is not None:
             params["style"] = style.value
-        first_page_res = await self.get_strafes(url, params)
-        first_page_data = first_page_res.json
-        if len(first_page_data) == 0:
+        page_length = 25
+        data, total, _ = await read_window(lambda p: self._fetch_page(url, params, p), (int(page) - 1) * page_length, page_length, 200,
+            self._pagination.get(url, params))
+        if total == 0:
             return [], 0
-        pagination_count = int(first_page_res.res.headers["Pagination-Count"])
-        if page == -1:
-            tasks = []
-            the_page = Incrementer(1)
-            while the_page.increment() < pagination_count:
-                params_copy = params.copy()
-                params_copy["page"] = the_page.get()
-                tasks.append(self.get_strafes(url, params_copy))
-            responses = await asyncio.gather(*tasks)
-            results = first_page_data
-            for response in responses:
-                results += response.json
-            return await self.make_record_list(results, user=user_data), -1
-        else:
-            page_length = 25
-            the_real_page, start = divmod((int(page) - 1) * page_length, 200)
-            the_real_page += 1
-            end = start + page_length
-            the_page_data = None
-            last_page_data = None
-            if pagination_count == 1:
-                the_page_data = first_page_data
-                last_page_data = first_page_data
-            elif the_real_page == 1:
-                the_page_data = first_page_data
-                params["page"] = pagination_count
-                the_res = await self.get_strafes(url, params)
-                last_page_data = the_res.json
-            elif the_real_page >= pagination_count:
-                params["page"] = pagination_count
-                the_res = await self.get_strafes(url, params)
-                last_page_data = the_res.json
-                the_page_data = last_page_data
-            else:
-                tasks = []
-                params_copy = params.copy()
-                params_copy["page"] = the_real_page
-                tasks.append(self.get_strafes(url, params_copy))
-                params_copy = params.copy()
-                params_copy["page"] = pagination_count
-                tasks.append(self.get_strafes(url, params_copy))
-                responses = await asyncio.gather(*tasks)
-                the_page_data = responses[0].json
-                last_page_data = responses[1].json
-            max_page = self.find_max_page(last_page_data, pagination_count, 200, page_length)
-            if page > max_page:
-                start = ((int(max_page) - 1) * page_length) % 200
-                end = start + page_length
-            return await self.make_record_list(the_page_data[start:end], user=user_data), max_page
+        return await self.make_record_list(data, user=user_data), count_pages(total, page_length)
 
     async def get_user_completion(self, user_data:User, game:Game, style:Style) -> Tuple[int, int]:
-        records, _ = await self.get_user_times(user_data, game, style, -1)
-        return len(records), await self.get_map_count(game)
-
-    #records is a list of records from a given map
-    @staticmethod
-    def sort_map(records:List[Dict[str, Any]]):
-        records.sort(key=lambda i: (i["Time"], i["Date"]))
+        times = await self.get_all_user_times(user_data, game, style)
+        return len(times), await self.get_map_count(game)
+
+    # returns a page of a map's leaderboard, from the cache if it's recent enough
+    # max_age: how old the cached page is allowed to be, defaults to the cache's ttl for the page
+    async def _get_leaderboard_page(self, board : Leaderboard, map_id : int, style : Style, page : int, max_age : float = None) -> List[Dict[str, Any]]:
+        if max_age is None:
+            max_age = self._leaderboards.max_age(page)
+        rows = board.get_page(page, max_age)
+        if rows is None:
+            res = await self.get_strafes(f"time/map/{map_id}", {
+                "style":style.value,
+                "page":page
+            })
+            rows = res.json
+            if len(rows) > 0:
+                board.set_page(page, rows, int(res.res.headers["Pagination-Count"]))
+            else:
+                board.set_page(page, rows, 0)
+            if page == 1:
+                self._top_times.set_page((map_id, style), rows)
+        return rows
 
     #changes a WR's diff and previous_record in place by comparing first and second place
     #times on the given map
     async def calculate_wr_diff(self, record : Record) -> bool:
         if record.previous_record is not None:
             return True
-        res = await self.get_strafes(f"time/map/{record.map.id}", {
-            "style":record.style.value,
-        })
-        data = res.json
+        key = (record.map.id, record.style)
+        top = self._top_times.top_two(key, record.id, record.time.millis)
+        if top is not None:
+            record.previous_record = await self.record_from_dict(top[1], map=record.map)
+            record.diff = round((record.time.millis - record.previous_record.time.millis) / 1000.0, 3)
+            return True
+        board = self._leaderboards.get(key)
+        data = await self._get_leaderboard_page(board, record.map.id, record.style, 1)
+        if len(data) > 0 and (data[0]["ID"] != record.id or data[0]["Time"] != record.time.millis):
+            # the cached page is from before this WR
+            data = await self._get_leaderboard_page(board, record.map.id, record.style, 1, 0)
         data = data[:20]
         if len(data) > 1:
-            self.sort_map(data)
+            data = sort_map_rows(data)
             if data[0]["ID"] != record.id:
                 return False
             record.previous_record = await self.record_from_dict(data[1])
             record.diff = round((record.time.millis - record.previous_record.time.millis) / 1000.0, 3)
         return True
 
-    # returns a list of lists of wrs, each list is a unique game/style combination
-    async def get_wrs(self):
-        tasks = []
+    # returns the recent wrs of every game/style, newest first
+    async def get_wrs(self) -> Dict[Tuple[Game, Style], List[Dict[str, Any]]]:
+        keys = []
         for game in DEFAULT_GAMES:
             for style in DEFAULT_STYLES:
                 if not (game == Game.SURF and style == Style.SCROLL):
-                    tasks.append(self.get_strafes("time/recent/wr", {
-                            "game":game.value,
-                            "style":style.value,
-                            "whitelist":"true"
-                        }))
-        wrs = []
-        responses = await asyncio.gather(*tasks)
-        for res in responses:
-            wrs.append(res.json)
-        return wrs
+                    keys.append((game, style))
+        responses = await self._pages.fetch(keys, lambda key: self.get_strafes("time/recent/wr", {
+                "game":key[0].value,
+                "style":key[1].value,
+                "whitelist":"true"
+            }))
+        return {key: res.json for key, res in zip(keys, responses)}
 
     async def write_wrs(self):
-        with open(fix_path("files/recent_wrs.json"), "w") as file:
-            json.dump(await self.get_wrs(), file)
+        await self._wr_feed.save(await self.get_wrs())
 
-    @staticmethod
-    def search(ls, record):
-        for i in ls:
-            if record["ID"] == i["ID"]:
-                return i
-        return None
+    # returns the newest wr events seen by get_new_wrs, see WRFeed.history
+    async def get_wr_history(self, game : Optional[Game] = None, style : Optional[Style] = None, limit : int = 50) -> List[Dict[str, Any]]:
+        return await self._wr_feed.history(game, style, limit)
 
     async def get_new_wrs(self) -> List[Record]:
-        try:
-            old_wrs = open_json("files/recent_wrs.json")
-        except FileNotFoundError:
+        if not await self._wr_feed.load():
             await self.write_wrs()
             return []
         new_wrs = await self.get_wrs()
-        globals:List[Record] = []
-        for i in range(len(new_wrs)):
-            for record in new_wrs[i]:
-                match = self.search(old_wrs[i], record)
-                if match:
-                    #records by the same person on the same map have the same id even if they beat it
-                    if record["Time"] != match["Time"]:
-                        r = await self.record_from_dict(record)
-                        r.diff = round((int(record["Time"]) - int(match["Time"])) / 1000.0, 3)
-                        r.previous_record = await self.record_from_dict(match)
-                        globals.append(r)
-                    #we can break here because the lists are sorted in the same fashion
-                    else:
-                        break
-                else:
-                    globals.append(await self.record_from_dict(record))
-
-        #overwrite recent_wrs.json with new wrs if they exist
-        if len(globals) > 0:
-            with open(fix_path("files/recent_wrs.json"), "w") as file:
-                json.dump(new_wrs, file)
+        try:
+            return await self._process_new_wrs(new_wrs)
+        finally:
+            self._top_times.drop_unconfirmed()
+
+    async def _process_new_wrs(self, new_wrs : Dict[Tuple[Game, Style], List[Dict[str, Any]]]) -> List[Record]:
+        # the newest WR of each map in the stored lists is its current WR, unless a newer one just came in
+        # only the ones the api still lists are used, a stored WR that has left the feed may have been deleted since
+        listed = {(row["ID"], row["Time"]) for rows in new_wrs.values() for row in rows}
+        for row in self._wr_feed.current_wrs():
+            if (row["ID"], row["Time"]) in listed:
+                self._top_times.seed((row["Map"], Style(row["Style"])), row)
+        changed_lists = {}
+        events = []
+        for key, rows in new_wrs.items():
+            changes = self._wr_feed.diff(key, rows)
+            if changes:
+                changed_lists[key] = rows
+                events += changes
+        for record, _ in sorted(events, key=lambda i: i[0]["Date"]):
+            self._top_times.add_wr((record["Map"], Style(record["Style"])), record)
+
+        # the users of every event and of the wr it replaced are looked up together
+        records = [record for record, _ in events]
+        matches = [match for _, match in events if match]
+        id_to_user = {}
+        if events:
+            id_to_user = await self.get_user_data_from_list(list({d["User"] for d in records + matches}))
+        if any(d["User"] not in id_to_user for d in records + matches):
+            raise NotFoundError()
+        globals:List[Record] = self.records_from_dicts(records, id_to_user)
+        previous = iter(self.records_from_dicts(matches, id_to_user))
+        for r, (record, match) in zip(globals, events):
+            if match:
+                r.diff = round((int(record["Time"]) - int(match["Time"])) / 1000.0, 3)
+                r.previous_record = next(previous)
+
+        #store the lists that changed and remember the new wrs
+        if len(changed_lists) > 0:
+            await self._wr_feed.save(changed_lists, events)
         
         tasks = []
         for wr in globals:
@@ -653,62 +894,21 @@ class StrafesClient:
 
     async def get_map_times(self, style:Style, map:Map, page:int) -> Tuple[List[Record], int]:
         page_length = 25
-        page_num, start = divmod((int(page) - 1) * page_length, 200)
-        page_num += 1
-        params = {
-            "style":style.value,
-            "page":page_num
-        }
-        res = await self.get_strafes(f"time/map/{map.id}", params)
-        data = res.json
-        if len(data) > 0:
-            page_count = int(res.res.headers["Pagination-Count"])
-            params["page"] = page_count
-            converted_page_count = await self.find_max_pages(f"time/map/{map.id}", params, page_count, 200, page_length)
-        else:
-            params["page"] = 1
-            first_page_res = await self.get_strafes(f"time/map/{map.id}", params)
-            if len(first_page_res.json) == 0:
-                return [], 0
-            else:
-                page_count = int(first_page_res.res.headers["Pagination-Count"])
-                params["page"] = page_count
-                tasks = [self.find_max_pages(f"time/map/{map.id}", params, page_count, 200, page_length), self.get_strafes(f"time/map/{map.id}", params)]
-                results = await asyncio.gather(*tasks)
-                converted_page_count = results[0]
-                page_num = converted_page_count
-                the_res = results[1]
-                data = the_res.json
-
-        #add the previous and next page so that we can sort the times across pages properly
-        before_len = 0
-        add_before = page_num > 1
-        add_after = page_num + 1 <= converted_page_count
-        tasks = []
-
-        if add_before:
-            copy = params.copy()
-            copy["page"] = page_num - 1
-            tasks.append(self.get_strafes(f"time/map/{map.id}", copy))
-        if add_after:
-            copy = params.copy()
-            copy["page"] = page_num + 1
-            tasks.append(self.get_strafes(f"time/map/{map.id}", copy))
-        
-        if add_before or add_after:
-            results : List[JSONRes] = await asyncio.gather(*tasks)
-            if add_before:
-                before_len = len(results[0].json)
-                data = results[0].json + data
-            if add_after:
-                data += results[-1].json
-
-        self.sort_map(data)
-        if page > converted_page_count:
-            start = ((int(converted_page_count) - 1) * page_length) % 200
-        start += before_len
-        end = start + page_length
-        return await self.make_record_list(data[start:end], map=map), converted_page_count
+        board = self._leaderboards.get((map.id, style))
+        info = self._pagination.get(f"time/map/{map.id}", {"style":style.value})
+        last_page = board.get_page(board.page_count, self._leaderboards.max_age(board.page_count))
+        if info is None and last_page is not None:
+            info = PageInfo(board.page_count, len(last_page))
+
+        async def fetch_page(p):
+            rows = await self._get_leaderboard_page(board, map.id, style, p)
+            return rows, board.page_count if len(rows) > 0 else None
+
+        #read the previous and next page too so that we can sort the times across pages properly
+        data, total, _ = await read_window(fetch_page, (int(page) - 1) * page_length, page_length, 200, info, pad=1, sort=sort_map_rows)
+        if total == 0:
+            return [], 0
+        return await self.make_record_list(data, map=map), count_pages(total, page_length)
 
     async def get_user_state(self, user_data:User) -> Optional[UserState]:
         try:
@@ -718,38 +918,31 @@ class StrafesClient:
             return None
 
     async def get_record_placement(self, record:Record) -> Tuple[int, int]:
-        params = {
-            "style":record.style.value,
-            "page":1
-        }
-        first_page_res = await self.get_strafes(f"time/map/{record.map.id}", params)
-        page_count = int(first_page_res.res.headers["Pagination-Count"])
-        completions = 0
-        tasks = [self.get_strafes(f"time/{record.id}/rank", {})]
-        if page_count == 1:
-            completions = len(first_page_res.json)
-            res = await asyncio.gather(*tasks)
-            rank = res[0].json["Rank"]
-        else:
-            params["page"] = page_count
-            tasks.append(self.get_strafes(f"time/map/{record.map.id}", params))
-            res = await asyncio.gather(*tasks)
-            rank = res[0].json["Rank"]
-            completions = len(res[1].json) + (page_count - 1) * 200
-        return rank, completions
+        board = self._leaderboards.get((record.map.id, record.style))
+        await self._get_leaderboard_page(board, record.map.id, record.style, 1)
+        page_count = board.page_count
+        if page_count == 0:
+            return 0, 0
+        last_page = await self._get_leaderboard_page(board, record.map.id, record.style, page_count)
+        completions = len(last_page) + (page_count - 1) * 200
+        placement = board.placement(record.id, self._leaderboards.ttl)
+        if placement is not None and placement[1]["Time"] == record.time.millis:
+            return placement[0], completions
+        res = await self.get_strafes(f"time/{record.id}/rank", {})
+        return res.json["Rank"], completions
 
     # this doesn't cache values that return None
-    @cached(ttl=24*60*60)
+    @cached(ttl=24*60*60, plugins=[HitMissRatioPlugin()])
     async def get_roblox_user_from_discord(self, discord_user_id : int) -> int:
-        res = await self.get_request(f"https://verify.eryn.io/api/user/{discord_user_id}", "eryn.io")
+        res = await self.get_request(f"{self._verify_url}user/{discord_user_id}", "eryn.io")
         return res.json["robloxId"]
 
-    @cached(ttl=60*60)
+    @cached(ttl=60*60, plugins=[HitMissRatioPlugin()])
     async def get_user_headshot_url(self, user_id : int) -> str:
-        res = await self.get_request(f"https://thumbnails.roblox.com/v1/users/avatar-headshot?userIds={user_id}&size=180x180&format=Png&isCircular=false", "Roblox Avatar")
+        res = await self.get_request(f"{self._thumbnails_url}users/avatar-headshot?userIds={user_id}&size=180x180&format=Png&isCircular=false", "Roblox Avatar")
         return f"{res.json['data'][0]['imageUrl']}?{random.randint(0, 100000)}"
 
-    @cached()
+    @cached(plugins=[HitMissRatioPlugin()])
     async def get_asset_thumbnail(self, asset_id : int) -> str:
-        res = await self.get_request(f"https://thumbnails.roblox.com/v1/assets?assetIds={asset_id}&size=250x250&format=Png&isCircular=false", "Roblox Asset")
+        res = await self.get_request(f"{self._thumbnails_url}assets?assetIds={asset_id}&size=250x250&format=Png&isCircular=false", "Roblox Asset")
         return res.json["data"][0]["imageUrl"]
\ No newline at end of file
@@ -75,43 +75,48 @@ class Style(Enum):
 setattr(Style, "__new__", lambda cls, value: super(Style, cls).__new__(cls, _STR_TO_STYLE[value] if isinstance(value, str) else value))
 DEFAULT_STYLES:List[Style] = [style for style in Style if style != Style.FASTE and style != Style.SUSTAIN]
 
+# the models use __slots__ since thousands of them get created for commands like !times txt and !compare
+# the display strings are only built the first time they are needed and then cached
 class Time:
+    __slots__ = ("millis", "_time_str")
+
     def __init__(self, millis):
         self.millis : int = millis
-        self._time_str = Time.format_time(millis)
+        self._time_str : Optional[str] = None
 
     def __str__(self):
+        if self._time_str is None:
+            self._time_str = Time.format_time(self.millis)
         return self._time_str
 
     @staticmethod
     def format_time(time):
         if time > 86400000:
             return ">1 day"
-        millis = Time.format_helper(time % 1000, 3)
-        seconds = Time.format_helper((time // 1000) % 60, 2)
-        minutes = Time.format_helper((time // (1000 * 60)) % 60, 2)
-        hours = Time.format_helper((time // (1000 * 60 * 60)) % 24, 2)
-        if hours == "00":
-            return minutes + ":" + seconds + "." + millis
+        hours = (time // (1000 * 60 * 60)) % 24
+        if hours == 0:
+            return f"{(time // (1000 * 60)) % 60:02d}:{(time // 1000) % 60:02d}.{time % 1000:03d}"
         else:
-            return hours + ":" + minutes + ":" + seconds
+            return f"{hours:02d}:{(time // (1000 * 60)) % 60:02d}:{(time // 1000) % 60:02d}"
 
     @staticmethod
     def format_helper(time, digits):
-        time = str(time)
-        while len(time) < digits:
-            time = "0" + time
-        return time
+        return str(time).zfill(digits)
 
 class Date:
+    __slots__ = ("timestamp", "_date_str")
+
     def __init__(self, timestamp):
         self.timestamp : int = timestamp
-        self._date_str = datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+        self._date_str : Optional[str] = None
 
     def __str__(self):
+        if self._date_str is None:
+            self._date_str = datetime.datetime.fromtimestamp(self.timestamp).strftime('%Y-%m-%d %H:%M:%S')
         return self._date_str
 
 class Map:
+    __slots__ = ("id", "displayname", "creator", "game", "date", "playcount")
 
     def __init__(self, id, displayname, creator, game, date, playcount):
         self.id : int = id
@@ -155,6 +160,8 @@ class UserState(Enum):
         return self.name
 
 class User:
+    __slots__ = ("id", "username", "displayname", "state")
+
     def __init__(self):
         self.id = -1
         self.username = ""
@@ -180,16 +187,16 @@ class User:
 
 class Rank:
     __ranks__ = ("New","Newb","Bad","Okay","Not Bad","Decent","Getting There","Advanced","Good","Great","Superb","Amazing","Sick","Master","Insane","Majestic","Baby Jesus","Jesus","Half God","God")
+    __slots__ = ("rank", "skill", "placement", "user")
 
     def __init__(self, rank, skill, placement, user):
         self.rank : int = rank
         self.skill : float = skill
         self.placement : int = placement
         self.user : User = user
-        self._rank_string = Rank.__ranks__[self.rank - 1]
 
     def __str__(self):
-        return self._rank_string
+        return Rank.__ranks__[self.rank - 1]
 
     @staticmethod
     def from_dict(data, user : User):
@@ -201,6 +208,8 @@ class Rank:
         )
 
 class Record:
+    __slots__ = ("id", "time", "user", "map", "date", "style", "mode", "game", "diff", "previous_record")
+
     def __init__(self, id, time, user, map, date, style, mode, game):
         self.id : int = id
         self.time : Time = time
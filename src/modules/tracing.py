@@ -0,0 +1,216 @@
+# tracing.py
+import asyncio
+import json
+import os
+import secrets
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Deque, Dict, Iterator, List, Optional, TypeVar
+
+from modules.utils import fix_path
+
+# lightweight tracing: a trace is started per command and every span opened while it runs (including in tasks
+# started from it, which inherit the current span) is recorded under it
+# when no trace is active span() does nothing, so instrumented code costs almost nothing outside of commands
+# work shared between commands (coalesced requests, user batches) runs detached() so it isn't charged to whichever
+# command started it, the commands waiting on it record their wait instead
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace : "Trace", name : str, parent_id : Optional[str], attributes : Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns : Optional[int] = None
+        self.attributes = attributes
+        self.error : Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e9
+
+    def set(self, key : str, value : Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name":self.name,
+            "span_id":self.span_id,
+            "parent_id":self.parent_id,
+            "start":self.start_ns / 1e9,
+            "duration":self.duration,
+            "attributes":self.attributes,
+            "error":self.error
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId":self.trace.trace_id,
+            "spanId":self.span_id,
+            "name":self.name,
+            "kind":1,
+            "startTimeUnixNano":str(self.start_ns),
+            "endTimeUnixNano":str(self.end_ns if self.end_ns is not None else self.start_ns),
+            "attributes":[_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status":{"code":2, "message":self.error} if self.error else {"code":1}
+        }
+        if self.parent_id is not None:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+def _otlp_attribute(key : str, value : Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key":key, "value":{"boolValue":value}}
+    elif isinstance(value, int):
+        return {"key":key, "value":{"intValue":str(value)}}
+    elif isinstance(value, float):
+        return {"key":key, "value":{"doubleValue":value}}
+    return {"key":key, "value":{"stringValue":str(value)}}
+
+class Trace:
+
+    def __init__(self, name : str, attributes : Dict[str, Any]):
+        self.trace_id = secrets.token_hex(16)
+        self.spans : List[Span] = []
+        # no spans are added once the trace has been exported
+        self.exported = False
+        self.root = Span(self, name, None, attributes)
+        self.spans.append(self.root)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"trace_id":self.trace_id, "name":self.root.name, "duration":self.root.duration, "spans":[span.to_dict() for span in self.spans]}
+
+    # an ExportTraceServiceRequest in the OTLP/JSON encoding, the format of the OpenTelemetry collector's file exporter
+    def to_otlp(self, service_name : str) -> Dict[str, Any]:
+        return {"resourceSpans":[{
+            "resource":{"attributes":[_otlp_attribute("service.name", service_name)]},
+            "scopeSpans":[{"scope":{"name":"rbhopdog"}, "spans":[span.to_otlp() for span in self.spans]}]
+        }]}
+
+    # returns an indented summary of the spans, slowest first among siblings
+    def summary(self) -> str:
+        children : Dict[Optional[str], List[Span]] = {}
+        for span in self.spans:
+            children.setdefault(span.parent_id, []).append(span)
+        lines = []
+        def add(span : Span, depth : int):
+            error = f" ERROR: {span.error}" if span.error else ""
+            lines.append(f"{'  ' * depth}{span.name}: {span.duration * 1000:.1f}ms{error}")
+            for child in sorted(children.get(span.span_id, ()), key=lambda s: -s.duration):
+                add(child, depth + 1)
+        add(self.root, 0)
+        return "\n".join(lines)
+
+_current_span : ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+# starts a trace whose root span is the current span until end_trace is called
+def start_trace(name : str, **attributes) -> Span:
+    span = Trace(name, attributes).root
+    _current_span.set(span)
+    return span
+
+def end_trace(span : Span, error : Optional[str] = None):
+    if span.end_ns is None:
+        span.end_ns = time.time_ns()
+        span.error = error
+        span.trace.exported = True
+        exporter.export(span.trace)
+    if _current_span.get() is span:
+        _current_span.set(None)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+# records a child span of the current span for the duration of the with block
+@contextmanager
+def span(name : str, **attributes) -> Iterator[Optional[Span]]:
+    parent = _current_span.get()
+    # tasks started by a command can outlive it, their spans are dropped once its trace is exported
+    if parent is None or parent.trace.exported:
+        yield None
+        return
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    parent.trace.spans.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as error:
+        child.error = f"{type(error).__name__}: {error}"
+        raise
+    finally:
+        child.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+T = TypeVar("T")
+
+# awaits awaitable without a current span, meant for tasks whose work is shared between callers
+async def detached(awaitable : Awaitable[T]) -> T:
+    token = _current_span.set(None)
+    try:
+        return await awaitable
+    finally:
+        _current_span.reset(token)
+
+# keeps the most recent traces in memory and optionally appends every finished trace to a file, one per line
+# format: "json" for this module's own format, "otlp" for OTLP/JSON, anything else to not write files
+class TraceExporter:
+
+    def __init__(self, format : str = "", directory : str = "files/traces", keep : int = 50, service_name : str = "rbhopdog"):
+        self.format = format
+        self.directory = directory
+        self.service_name = service_name
+        self.recent : Deque[Trace] = deque(maxlen=keep)
+        self._buffer : List[str] = []
+        self._flush_task : Optional[asyncio.Task] = None
+
+    def export(self, trace : Trace):
+        self.recent.append(trace)
+        if self.format == "json":
+            self._buffer.append(json.dumps(trace.to_dict(), default=str))
+        elif self.format == "otlp":
+            self._buffer.append(json.dumps(trace.to_otlp(self.service_name)))
+        else:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            lines = self._buffer
+            self._buffer = []
+            self._write(lines)
+            return
+        # the lines are written on a worker thread, traces exported while a write is running go in the next one
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        while self._buffer:
+            lines = self._buffer
+            self._buffer = []
+            await asyncio.to_thread(self._write, lines)
+
+    def _write(self, lines : List[str]):
+        try:
+            directory = fix_path(self.directory)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"traces-{time.strftime('%Y%m%d')}.{self.format}.jsonl")
+            with open(path, "a") as file:
+                file.write("".join(line + "\n" for line in lines))
+        except OSError as error:
+            print(f"Couldn't write traces: {error}")
+
+    # waits for buffered traces to be written
+    async def close(self):
+        if self._flush_task is not None:
+            await self._flush_task
+
+exporter = TraceExporter()
+
+def configure(format : str = "", directory : str = "files/traces"):
+    exporter.format = format
+    exporter.directory = directory
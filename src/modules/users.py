@@ -0,0 +1,131 @@
+# users.py
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from modules import tracing
+from modules.strafes_base import User
+
+# resolves roblox user ids to users in batches
+# lookups made within window seconds of each other (from any coroutine) are sent as one bulk request,
+# split into chunks of max_batch ids, and every resolved user is cached for ttl seconds
+# fetch: takes a list of ids and returns the users it found by id, missing ids resolve to None
+class UserResolver:
+
+    def __init__(self, fetch : Callable[[List[int]], Awaitable[Dict[int, User]]], window : float = 0.01, max_batch : int = 100, ttl : float = 60*60, max_users : int = 50000):
+        self._fetch = fetch
+        self.window = window
+        self.max_batch = max_batch
+        self.ttl = ttl
+        self.max_users = max_users
+        self._cache : "OrderedDict[int, Tuple[float, User]]" = OrderedDict()
+        self._pending : Dict[int, asyncio.Future] = {}
+        self._batch : List[int] = []
+        self._flush_handle : Optional[asyncio.TimerHandle] = None
+        self._tasks : Set[asyncio.Task] = set()
+        self.hits : int = 0
+        self.misses : int = 0
+        self.requests : int = 0
+
+    def cached(self, user_id : int) -> Optional[User]:
+        entry = self._cache.get(user_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._cache[user_id]
+            return None
+        self._cache.move_to_end(user_id)
+        return entry[1]
+
+    def put(self, user : User):
+        self._cache[user.id] = (time.monotonic(), user)
+        self._cache.move_to_end(user.id)
+        while len(self._cache) > self.max_users:
+            self._cache.popitem(last=False)
+
+    def _future(self, user_id : int) -> asyncio.Future:
+        future = self._pending.get(user_id)
+        if future is None:
+            self.misses += 1
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[user_id] = future
+            self._batch.append(user_id)
+            if len(self._batch) >= self.max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.window, self._flush)
+        return future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch = self._batch
+        self._batch = []
+        for i in range(0, len(batch), self.max_batch):
+            # the batch is shared by every caller in it, so it isn't traced as part of any of them
+            task = asyncio.ensure_future(tracing.detached(self._resolve(batch[i:i+self.max_batch])))
+            # keep a reference so the task isn't garbage collected while it runs
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, user_ids : List[int]):
+        self.requests += 1
+        try:
+            users = await self._fetch(user_ids)
+        except Exception as e:
+            for user_id in user_ids:
+                future = self._pending.pop(user_id)
+                if not future.done():
+                    future.set_exception(e)
+                    # mark the exception as retrieved in case every caller was cancelled
+                    future.exception()
+            return
+        except asyncio.CancelledError:
+            for user_id in user_ids:
+                self._pending.pop(user_id).cancel()
+            raise
+        for user_id in user_ids:
+            user = users.get(user_id)
+            if user is not None:
+                self.put(user)
+            future = self._pending.pop(user_id)
+            if not future.done():
+                future.set_result(user)
+
+    # returns None if the user doesn't exist
+    async def get(self, user_id : int) -> Optional[User]:
+        user = self.cached(user_id)
+        if user is not None:
+            self.hits += 1
+            return user
+        # shielded so one caller being cancelled doesn't cancel the lookup for everyone else
+        with tracing.span("waited for batch", users=1):
+            return await asyncio.shield(self._future(user_id))
+
+    # returns the users that exist by id
+    async def get_many(self, user_ids : Iterable[int]) -> Dict[int, User]:
+        users : Dict[int, User] = {}
+        futures : Dict[int, asyncio.Future] = {}
+        for user_id in user_ids:
+            if user_id in users or user_id in futures:
+                continue
+            user = self.cached(user_id)
+            if user is not None:
+                self.hits += 1
+                users[user_id] = user
+            else:
+                futures[user_id] = self._future(user_id)
+        if futures:
+            # no need to wait for the window, nothing else is going to be added to this batch from here
+            if self._batch:
+                self._flush()
+            with tracing.span("waited for batch", users=len(futures)):
+                await asyncio.shield(asyncio.gather(*futures.values(), return_exceptions=True))
+            for user_id, future in futures.items():
+                user = future.result()
+                if user is not None:
+                    users[user_id] = user
+        return users
@@ -0,0 +1,64 @@
+# usertimes.py
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+# every time a user has in a game/style, newest first, as returned by the api
+class UserTimes:
+
+    def __init__(self, rows : List[Dict[str, Any]]):
+        self.rows = rows
+        self.by_id : Dict[int, Dict[str, Any]] = {row["ID"]: row for row in rows}
+        self.full_sync : float = time.monotonic()
+
+    # records keep their ID when a user beats their time, so the time and date have to match too
+    def has(self, row : Dict[str, Any]) -> bool:
+        old = self.by_id.get(row["ID"])
+        return old is not None and old["Time"] == row["Time"] and old["Date"] == row["Date"]
+
+    # new_rows are the rows that are newer than anything in this entry, newest first
+    def merge(self, new_rows : List[Dict[str, Any]]) -> "UserTimes":
+        if not new_rows:
+            return self
+        new_ids = {row["ID"] for row in new_rows}
+        merged = UserTimes(new_rows + [row for row in self.rows if row["ID"] not in new_ids])
+        merged.full_sync = self.full_sync
+        return merged
+
+# LRU cache of UserTimes keyed by (user id, game, style)
+# entries are replaced rather than modified so lists handed out stay valid
+# full_sync_ttl: how often an entry is rebuilt from scratch, this picks up times that were deleted
+# max_rows: the total number of rows kept across all entries
+class UserTimesCache:
+
+    def __init__(self, full_sync_ttl : float = 60*60, max_rows : int = 200000):
+        self.full_sync_ttl = full_sync_ttl
+        self.max_rows = max_rows
+        self._entries : "OrderedDict[Hashable, UserTimes]" = OrderedDict()
+        self._rows : int = 0
+        self.hits : int = 0
+        self.misses : int = 0
+
+    def get(self, key : Hashable) -> Optional[UserTimes]:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry.full_sync > self.full_sync_ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key : Hashable, entry : UserTimes):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._rows -= len(old.rows)
+        self._entries[key] = entry
+        self._rows += len(entry.rows)
+        while self._rows > self.max_rows and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._rows -= len(evicted.rows)
+
+    def invalidate(self, key : Hashable):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._rows -= len(old.rows)
@@ -13,6 +13,14 @@ def open_json(path):
         data = file.read()
         return json.loads(data)
 
+# writes to a temporary file first so readers never see a partially written file
+def write_json_atomic(path, data):
+    path = fix_path(path)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(data, file)
+    os.replace(tmp_path, path)
+
 def fmt_md_code(s : str) -> str:
     s = s.replace("`", "") # don't allow the ` character to prevent escaping code blocks
     return f"```\n{s}```"
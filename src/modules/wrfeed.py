@@ -0,0 +1,156 @@
+# wrfeed.py
+import asyncio
+import json
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from modules.strafes_base import Game, Style
+from modules.utils import fix_path
+
+WRKey = Tuple[Game, Style]
+# (new wr, the wr it replaced if it had the same id)
+WRChange = Tuple[Dict[str, Any], Optional[Dict[str, Any]]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recent_wrs (
+    id INTEGER PRIMARY KEY,
+    game INTEGER NOT NULL,
+    style INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS recent_wrs_game_style ON recent_wrs (game, style, position);
+CREATE TABLE IF NOT EXISTS wr_events (
+    event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    record_id INTEGER NOT NULL,
+    game INTEGER NOT NULL,
+    style INTEGER NOT NULL,
+    map INTEGER NOT NULL,
+    user INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    date INTEGER NOT NULL,
+    previous_time INTEGER,
+    seen INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS wr_events_record ON wr_events (record_id);
+CREATE INDEX IF NOT EXISTS wr_events_game_style ON wr_events (game, style, date);
+"""
+
+# stores the latest list of recent wrs for every game/style and a history of every new wr that was seen
+# the lists are kept in memory and compared against new polls there, the database is only written to when
+# something changed, in one transaction on a worker thread so the event loop never waits on the disk
+class WRFeed:
+
+    def __init__(self, path : str):
+        self.path = fix_path(path)
+        self._conn : Optional[sqlite3.Connection] = None
+        self._lock = asyncio.Lock()
+        self._lists : Optional[Dict[WRKey, List[Dict[str, Any]]]] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    async def _run(self, func, *args) -> Any:
+        async with self._lock:
+            return await asyncio.to_thread(func, *args)
+
+    def _load(self) -> Dict[WRKey, List[Dict[str, Any]]]:
+        lists : Dict[WRKey, List[Dict[str, Any]]] = {}
+        for game, style, data in self._connect().execute("SELECT game, style, data FROM recent_wrs ORDER BY game, style, position"):
+            try:
+                key = (Game(game), Style(style))
+            except ValueError:
+                continue
+            lists.setdefault(key, []).append(json.loads(data))
+        return lists
+
+    # returns False if nothing has been stored yet
+    async def load(self) -> bool:
+        if self._lists is None:
+            self._lists = await self._run(self._load)
+        return len(self._lists) > 0
+
+    # returns the changes in rows compared to the stored list for key, rows should be newest first like the api returns them
+    def diff(self, key : WRKey, rows : Iterable[Dict[str, Any]]) -> List[WRChange]:
+        old_rows = {row["ID"]: row for row in self._lists.get(key, ())} if self._lists else {}
+        changes : List[WRChange] = []
+        for row in rows:
+            match = old_rows.get(row["ID"])
+            if match is None:
+                changes.append((row, None))
+            # records by the same person on the same map have the same id even if they beat it
+            elif row["Time"] != match["Time"]:
+                changes.append((row, match))
+            # we can break here because the lists are sorted in the same fashion
+            else:
+                break
+        return changes
+
+    # returns the newest row of every (map, style) in the stored lists
+    def current_wrs(self) -> List[Dict[str, Any]]:
+        seen = set()
+        rows = []
+        for ls in (self._lists or {}).values():
+            for row in ls:
+                key = (row["Map"], row["Style"])
+                if key not in seen:
+                    seen.add(key)
+                    rows.append(row)
+        return rows
+
+    def _save(self, lists : Dict[WRKey, List[Dict[str, Any]]], events : List[WRChange]):
+        conn = self._connect()
+        seen = int(time.time())
+        with conn:
+            for (game, style), rows in lists.items():
+                conn.execute("DELETE FROM recent_wrs WHERE game = ? AND style = ?", (game.value, style.value))
+                conn.executemany("INSERT OR REPLACE INTO recent_wrs (id, game, style, position, time, data) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(row["ID"], game.value, style.value, i, row["Time"], json.dumps(row)) for i, row in enumerate(rows)])
+            conn.executemany("INSERT INTO wr_events (record_id, game, style, map, user, time, date, previous_time, seen, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(row["ID"], row["Game"], row["Style"], row["Map"], row["User"], row["Time"], row["Date"], None if previous is None else previous["Time"], seen, json.dumps(row))
+                    for row, previous in events])
+
+    # replaces the stored lists of the keys in lists and adds events to the history
+    async def save(self, lists : Dict[WRKey, List[Dict[str, Any]]], events : List[WRChange] = []):
+        await self._run(self._save, lists, events)
+        if self._lists is None:
+            self._lists = {}
+        self._lists.update(lists)
+
+    def _history(self, game : Optional[Game], style : Optional[Style], limit : int) -> List[Dict[str, Any]]:
+        query = "SELECT data, previous_time, seen FROM wr_events"
+        conditions = []
+        params : List[Any] = []
+        if game is not None:
+            conditions.append("game = ?")
+            params.append(game.value)
+        if style is not None:
+            conditions.append("style = ?")
+            params.append(style.value)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY date DESC, event_id DESC LIMIT ?"
+        params.append(limit)
+        events = []
+        for data, previous_time, seen in self._connect().execute(query, params):
+            event = json.loads(data)
+            event["PreviousTime"] = previous_time
+            event["Seen"] = seen
+            events.append(event)
+        return events
+
+    # returns the newest wr events (the api's record dict with PreviousTime and Seen added), optionally for one game/style
+    async def history(self, game : Optional[Game] = None, style : Optional[Style] = None, limit : int = 50) -> List[Dict[str, Any]]:
+        return await self._run(self._history, game, style, limit)
+
+    async def close(self):
+        if self._conn is not None:
+            conn = self._conn
+            self._conn = None
+            await self._run(conn.close)